@@ -1,49 +1,110 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, make_response, flash
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from models import db, Participant, save_participant_data, calculate_human_player_average, calculate_ai_player_average
-from sqlalchemy import func
-import requests
-from openai import OpenAI
-import numpy as np
+import click
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, session, jsonify, make_response, flash, abort, Response, stream_with_context
+from models import db, Participant, save_participant_data, calculate_human_player_average, calculate_ai_player_average, claim_bot_decision, complete_bot_decision, get_bot_decision, count_bot_contributions, claim_round, round_claim_active, get_session_summaries, finalize_participant, record_dropout_bonus, unfinalized_participants, save_questionnaire
+from conversation_store import load_conversation, save_conversation
+from prompts import build_decision_prompt, count_prompt_tokens, decision_request_options, parse_contribution
+from historic_averages import historic_averages, recompute_study_averages, seed_from_csv
+import game_engine
+from game_engine import initial_tokens, round_payoffs, bonus_usd, earnings_usd, control_answer_key
+from export import export_statement, iter_csv, write_csv, write_parquet
+from page_cache import cached_page, page_response
+from decision_cache import cache_enabled, decision_cache_key, lookup_decision, store_decision
+from decisions import decision_key, submit_decision, decision_status, pop_decision, prefetch_enabled, submit_prefetch, take_prefetch, max_decision_workers, max_prefetch_workers, worker_id, decision_mode, max_async_decisions, max_async_prefetches, event_loop
+import metrics
+import event_log
+import assets
+from event_log import log_event, log_error
+from scheduler import rate_scheduler_from_env
+from strategies import LLMStrategy, ResilientStrategy, CircuitBreaker, make_strategy
+from sqlalchemy import text
 import secrets
+import threading
 import time  # Ensure time is imported correctly
 import datetime
-import re
+import asyncio
 
 
-# Use the environment variable for OpenAI API key
-client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
+# OpenAI client with explicit timeouts, bounded retries and hedging, configured from the
+# environment; created on first use (see get_client) so importing the app stays cheap
+client = None
+client_lock = threading.Lock()
 
-app = Flask(__name__)
-app.secret_key = os.environ.get('SECRET_KEY')
+# Requests/tokens-per-minute budget shared by all workers (None unless OPENAI_RPM_LIMIT/OPENAI_TPM_LIMIT is set)
+scheduler = rate_scheduler_from_env()
+scheduler_max_wait = float(os.getenv('SCHEDULER_MAX_WAIT', 30))
 
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-# Initialize the db with the app, which was created in models.py
-db.init_app(app)
+def create_app():
+    # Builds and configures the Flask app. Nothing here opens a connection or imports the
+    # OpenAI SDK; warm_up() does that per worker once it has forked.
+    flask_app = Flask(__name__)
+    flask_app.secret_key = os.environ.get('SECRET_KEY')
 
-# Initialize Flask-Migrate with the app and db
-migrate = Migrate(app, db)
+    flask_app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+    flask_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # Initialize the db with the app, which was created in models.py
+    db.init_app(flask_app)
 
-# Game settings
-initial_tokens = 10
+    # Request, database, rendering and decision metrics, served at /metrics
+    metrics.init_app(flask_app)
+
+    # Structured JSON log events, written to stdout off the request thread
+    event_log.init_app(flask_app)
+
+    # Content-hashed CSS, JS and fonts from static/, linked with asset_url() in templates
+    assets.init_app(flask_app)
+
+    # Routes, the cookie-restoring hook and the CLI commands defined below
+    flask_app.register_blueprint(study)
+
+    # Flask-Migrate (and Alembic behind it) is only needed by `flask db ...`, which loads the
+    # app from inside a click command; the web server never does, so it never imports them
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+        Migrate(flask_app, db)
+
+    return flask_app
+
+
+# The participant-facing pages, status and export endpoints, and the flask commands; each
+# app that create_app() builds registers them
+study = Blueprint('study', __name__, cli_group=None)
+
+
+# Game settings (payoff rules live in game_engine)
 total_games = 10  # Number of one-shot games in each session
 total_sessions = 2  # Number of sessions
 
+# Request profile for bot decisions: a couple of output tokens biased toward 0-10
+decision_options = decision_request_options(
+    model="gpt-4o",
+    max_contribution=initial_tokens,
+    max_tokens=int(os.getenv('DECISION_MAX_TOKENS', 2)),
+    logit_bias=int(os.getenv('DECISION_LOGIT_BIAS', 10))
+)
+
+# Seconds the waiting page polls for the bot's decision before falling back to /outcome
+decision_wait_time = int(os.getenv('DECISION_WAIT_TIME', 60))
+# Seconds a decision waits for a prefetch still running before asking OpenAI itself
+prefetch_wait_time = float(os.getenv('PREFETCH_WAIT_TIME', 20))
+# Latency budgets (seconds) for the primary bot strategy before the local fallback answers
+decision_budget = float(os.getenv('DECISION_BUDGET', 8))
+prefetch_budget = float(os.getenv('PREFETCH_BUDGET', 30))
+# Seconds a worker's claim on finishing a round lasts before another worker may take over
+round_lease_time = decision_budget + float(os.getenv('ROUND_LEASE_MARGIN', 10))
+
 
 # Function to restore state from cookies
-@app.before_request
+@study.before_app_request
 def restore_state_from_cookies():
     if 'session_num' not in session:
         session['session_num'] = int(request.cookies.get('session_num', 1))
     if 'game' not in session:
         session['game'] = int(request.cookies.get('game', 1))
 
-@app.route('/')
+@study.route('/')
 def welcome():
     # Capture Prolific PID and Session ID from URL parameters
     prolific_pid = request.args.get('PROLIFIC_PID')
@@ -66,21 +127,21 @@ def welcome():
     if last_page and game and session_num:
         session['game'] = int(game)
         session['session_num'] = int(session_num)
-        return redirect(url_for(last_page))
+        return redirect(url_for(f'study.{last_page}'))
 
-    return redirect(url_for('check_cookies'))
+    return redirect(url_for('study.check_cookies'))
 
-@app.route('/check_cookies')
+@study.route('/check_cookies')
 def check_cookies():
-    resp = make_response(redirect(url_for('show_welcome')))
+    resp = make_response(redirect(url_for('study.show_welcome')))
     resp.set_cookie('test_cookie', 'test_value', max_age=3600)  # Expires in 1 hour
     return resp
 
-@app.route('/cookies_required')
+@study.route('/cookies_required')
 def cookies_required():
-    return render_template('cookies_required.html')
+    return page_response('cookies_required.html')
 
-@app.route('/show_welcome')
+@study.route('/show_welcome')
 def show_welcome():
     # Assign a random participant ID if it does not exist
     if 'participant_id' not in session:
@@ -89,11 +150,11 @@ def show_welcome():
     # Initialize the start timestamp if it's not already set
     if 'start_timestamp' not in session:
         session['start_timestamp'] = datetime.datetime.now(datetime.UTC)  # Record the start timestamp
-    return render_template('welcome.html')
+    return page_response('welcome.html')
 
-@app.route('/instructions')
+@study.route('/instructions')
 def instructions():
-    resp = make_response(render_template('instructions.html'))
+    resp = page_response('instructions.html')
 
     # Set cookies for last visited page, game number, and session number
     resp.set_cookie('last_page', 'instructions', max_age=3600)
@@ -102,17 +163,16 @@ def instructions():
     
     return resp
 
-@app.route('/start')
+@study.route('/start')
 def start():
     # Randomly assign to control or experimental group
     if 'group' not in session:
-        session['group'] = np.random.choice(['control', 'experimental'])
-        print(f"Group assigned: {session['group']}")  # Log when group is assigned
+        session['group'] = secrets.choice(['control', 'experimental'])
+        log_event('group_assigned', group=session['group'])
 
     # Initialize session data only if it does not exist
     if 'session_num' not in session:
         session['session_num'] = 1
-        session['game_history'] = []  # Initialize game history for this session
         session['contributions'] = []  # Initialize contributions list
 
     # Initialize other session-related variables
@@ -120,14 +180,23 @@ def start():
     session['intervention'] = False
     session['session_started'] = True
 
-    return redirect(url_for('game'))
+    return redirect(url_for('study.game'))
 
-@app.route('/game')
+@study.route('/game')
 def game():
     # Use session.get() without overwriting the session['game'] value
     game = session.get('game', 1)
     session_num = session.get('session_num', 1)
 
+    # The bot's move only depends on earlier rounds, so start it while the participant chooses
+    if prefetch_enabled and 'participant_id' in session and 'group' in session:
+        participant_id = session['participant_id']
+        submit_prefetch(
+            decision_key(participant_id, session_num, game),
+            prefetch_move, current_app._get_current_object(), participant_id, session_num, game,
+            build_decision_context(participant_id, session_num, game, session['group'])
+        )
+
     # Render the game page with the correct session data
     resp = make_response(render_template('index.html', game=game, session_num=session_num))
 
@@ -138,13 +207,13 @@ def game():
 
     return resp
 
-@app.route('/play/<int:contribution>', methods=['POST'])
+@study.route('/play/<int:contribution>', methods=['POST'])
 def play(contribution):
     # Store the human contribution in the session
     session['current_contribution'] = contribution
 
     # Log the human contribution
-    print(f"(Human) Contribution (Game {session['game']}, Session {session['session_num']}): {contribution}")
+    log_event('contribution', contribution=contribution)
 
     # Add the contribution to the list
     if 'contributions' in session:
@@ -153,208 +222,537 @@ def play(contribution):
         session['contributions'] = [contribution]
 
     # Redirect to the waiting page while the AI's move is being calculated
-    return redirect(url_for('waiting'))
+    return redirect(url_for('study.waiting'))
 
-@app.route('/waiting')
-def waiting():
-    prolific_pid = session.get('prolific_pid')  # Retrieve from session
-    session_id = session.get('session_id')      # Retrieve from session
-    contribution = session.get('current_contribution', 0)
-
-    # Retrieve INCOM values from session, default to None if not set
-    incom_1 = session.get('incom_1', None)
-    incom_2 = session.get('incom_2', None)
-    incom_3 = session.get('incom_3', None)
-    incom_4 = session.get('incom_4', None)
-    incom_5 = session.get('incom_5', None)
-    incom_6 = session.get('incom_6', None)
+def get_conversation(participant_id):
+    # The conversation lives server-side; the cookie only carries the version we last wrote
+    return load_conversation(participant_id, session.get('conversation_version'))
 
-    game_num = session['game']
-    session_num = session['session_num']
-    participant_id = session['participant_id']
-    group = session['group']
-
-    # Check if this game has already been processed
-    existing_entry = Participant.query.filter_by(
-        participant_id=participant_id,
-        session_num=session_num,
-        round_num=game_num
-    ).first()
+def put_conversation(participant_id, conversation):
+    session['conversation_version'] = save_conversation(participant_id, conversation)
 
-    if existing_entry:
-        print(f"Game {game_num} of session {session_num} for participant {participant_id} has already been processed. Skipping.")
-        return redirect(url_for('outcome'))
+def build_decision_context(participant_id, session_num, game_num, group):
+    # The prompt is rebuilt from the canonical round history, so it only grows by one line per round
+    game_history = get_conversation(participant_id)['game_history']
 
-    # Fetch game history for the current session only
-    game_history = [game for game in session.get('game_history', []) if game['game_num'] <= total_games and game.get('session_num') == session_num]
-
-    # Retrieve previous assistant messages from the session
-    previous_messages = session.get('previous_messages', [])
+    # If this is session 2 and the group is not 'control', add average contributions to the prompt
+    ai_avg_contribution = None
+    historic_ai_avg_contribution = None
+    if session_num == 2 and group != 'control':
+        ai_avg_contribution = round(calculate_ai_player_average(participant_id), 1)
+        # Baseline for the session just played, from the shared cache rather than a table scan
+        historic_ai_avg_contribution = historic_averages(group, session_num - 1)[1]
 
-    # Construct the new user message for the current round
-    new_message = {
-        "role": "user",
-        "content": "\nHere's the history of your games with this player so far:\n"
+    messages = build_decision_prompt(
+        game_history, session_num, total_games,
+        ai_avg_contribution=ai_avg_contribution,
+        historic_ai_avg_contribution=historic_ai_avg_contribution
+    )
+
+    # Everything a bot strategy may need, without touching the request session
+    return {
+        'participant_id': participant_id,
+        'messages': messages,
+        'game_history': [game_info for game_info in game_history if game_info.get('session_num') == session_num],
+        'session_num': session_num,
+        'round_num': game_num,
+        'group': group,
+        # Participants further into the 20-round flow go first when OpenAI capacity is short
+        'priority': (session_num - 1) * total_games + game_num
     }
 
-    for game_info in game_history:
-        new_message['content'] += f"Game {game_info['game_num']}: Human contributed {game_info['human_contribution']}, You contributed {game_info['bot_contribution']}.\n"
+def request_bot_contribution(messages, priority=0, deadline=None):
+    prompt_tokens = count_prompt_tokens(messages, model="gpt-4o")
 
-    new_message['content'] += "\nIt's your move. Provide a number between 0 and 10 for your tokens contribution for this game. Do not provide justification, just a number."
+    # Wait for the shared OpenAI budget so a batch launch queues instead of hitting 429s
+    admit = None
+    if scheduler is not None:
+        request_tokens = prompt_tokens + decision_options['max_tokens']
 
-    # Add the new user message to the conversation
-    previous_messages.append(new_message)
+        def admit(blocking):
+            # Retries queue for budget like any request; hedges only go out if budget is spare
+            if not blocking:
+                return scheduler.try_acquire(request_tokens)
+            waited = scheduler.acquire(request_tokens, priority=priority, timeout=scheduler_max_wait, deadline=deadline)
+            metrics.openai_scheduler_wait.observe(waited)
+            if waited > 1:
+                log_event('scheduler_wait', "Waited for the OpenAI rate budget", waited_ms=round(waited * 1000))
+            return True
 
-    # If this is session 2 and the group is not 'control', add average contributions to the message
-    if session_num == 2 and group != 'control':
-        ai_avg_contribution = round(calculate_ai_player_average(participant_id), 1)
-        historic_ai_avg_contribution = 8.1  # Replace with actual calculation if needed
-        
-        previous_messages.append({
-            "role": "system",
-            "content": (
-                f"In the previous session, the AI's average contribution was {ai_avg_contribution}, "
-                f"while the historic AI average contribution is {historic_ai_avg_contribution}."
-            )
-        })
+        admit(True)
 
-    # System instructions (only needed once, placed before the conversation starts)
-    system_message = {
-        "role": "system",
-        "content": (
-            "You are playing a one-shot public goods game against a human. Each game, you receive 10 tokens. "
-            "You can contribute between 0 and 10 tokens to a group account. If the total contribution of both players is 10 or more, "
-            "the total contribution is multiplied by 1.5. The remaining tokens in your private account are added to half of the group account. "
-            "Earnings from private and group accounts are summed up and form your game score. Your goal is to maximize your score."
-            "Your goal is to maximize your score over 10 rounds by adapting to the human player's contributions."
-            "Adjust your contribution dynamically based on the human's previous contributions."
-        )
+    started = time.monotonic()
+    try:
+        completion = get_client().create(messages, model="gpt-4o", admit=admit, deadline=deadline, **decision_options)
+        bot_contribution = parse_contribution(completion.choices[0].message.content, initial_tokens)
+    except Exception as e:
+        metrics.openai_latency.labels(metrics.openai_outcome(e)).observe(time.monotonic() - started)
+        log_error('openai_error', f"Error occurred during API call: {e}", latency_ms=round((time.monotonic() - started) * 1000))
+        raise
+    metrics.openai_latency.labels('ok').observe(time.monotonic() - started)
+
+    # Log prompt size and latency so per-decision cost can be checked across rounds
+    log_event('openai_request', latency_ms=round((time.monotonic() - started) * 1000), prompt_tokens=prompt_tokens)
+    return bot_contribution
+
+def get_client():
+    global client
+    with client_lock:
+        if client is None:
+            from llm_client import decision_client_from_env
+            client = decision_client_from_env()
+    return client
+
+def choose_bot_contribution(messages, session_num, group, priority=0, deadline=None):
+    # Common game states (e.g. everyone's first round) can be answered from the shared cache
+    cache_key = decision_cache_key("gpt-4o", messages, session_num, group)
+    bot_contribution = lookup_decision(cache_key)
+    if bot_contribution is not None:
+        log_event('decision_cache_hit', session_num=session_num, group=group, bot_contribution=bot_contribution)
+        return bot_contribution
+
+    bot_contribution = request_bot_contribution(messages, priority, deadline)
+    store_decision(cache_key, bot_contribution)
+    return bot_contribution
+
+def llm_decision(context):
+    # Runs on the strategy executor with the caller's context, but gets an app context (and
+    # so a database session) of its own
+    with current_app._get_current_object().app_context():
+        return choose_bot_contribution(context['messages'], context['session_num'], context['group'], context['priority'], context.get('deadline'))
+
+# DECISION_MODE=async: the same decision flow as coroutines on the decision event loop (see
+# decisions.py). Only the OpenAI round-trip is awaited on the loop; database work still runs
+# synchronously, on the loop's bounded thread pool and in an app context of its own, so every
+# call gets its own scoped session.
+async_client = None
+
+def get_async_client():
+    # Created on first use, on the loop it belongs to
+    global async_client
+    if async_client is None:
+        from llm_client import async_decision_client_from_env
+        async_client = async_decision_client_from_env(pool_size=max_async_decisions + max_async_prefetches)
+    return async_client
+
+async def get_async_client_ready():
+    return await get_async_client().warm_up()
+
+async def in_app_context(fn, *args, **kwargs):
+    # Runs blocking database work on a thread, inside an app context of the current app, so the
+    # event loop never waits on it
+    flask_app = current_app._get_current_object()
+
+    def call():
+        with flask_app.app_context():
+            return fn(*args, **kwargs)
+    return await asyncio.to_thread(call)
+
+async def request_bot_contribution_async(messages, priority=0, deadline=None):
+    prompt_tokens = count_prompt_tokens(messages, model="gpt-4o")
+
+    admit = None
+    if scheduler is not None:
+        request_tokens = prompt_tokens + decision_options['max_tokens']
+
+        async def admit(blocking):
+            if not blocking:
+                return await in_app_context(scheduler.try_acquire, request_tokens)
+            waited = await in_app_context(scheduler.acquire, request_tokens, priority=priority, timeout=scheduler_max_wait, deadline=deadline)
+            metrics.openai_scheduler_wait.observe(waited)
+            if waited > 1:
+                log_event('scheduler_wait', "Waited for the OpenAI rate budget", waited_ms=round(waited * 1000))
+            return True
+
+        await admit(True)
+
+    started = time.monotonic()
+    try:
+        completion = await get_async_client().create(messages, model="gpt-4o", admit=admit, deadline=deadline, **decision_options)
+        bot_contribution = parse_contribution(completion.choices[0].message.content, initial_tokens)
+    except Exception as e:
+        metrics.openai_latency.labels(metrics.openai_outcome(e)).observe(time.monotonic() - started)
+        log_error('openai_error', f"Error occurred during API call: {e}", latency_ms=round((time.monotonic() - started) * 1000))
+        raise
+    metrics.openai_latency.labels('ok').observe(time.monotonic() - started)
+
+    log_event('openai_request', latency_ms=round((time.monotonic() - started) * 1000), prompt_tokens=prompt_tokens)
+    return bot_contribution
+
+async def llm_decision_async(context):
+    messages, session_num, group = context['messages'], context['session_num'], context['group']
+    if not cache_enabled():
+        # Skip the hop to a database thread when there is no cache to consult
+        return await request_bot_contribution_async(messages, context['priority'], context.get('deadline'))
+
+    cache_key = decision_cache_key("gpt-4o", messages, session_num, group)
+    bot_contribution = await in_app_context(lookup_decision, cache_key)
+    if bot_contribution is not None:
+        log_event('decision_cache_hit', session_num=session_num, group=group, bot_contribution=bot_contribution)
+        return bot_contribution
+
+    bot_contribution = await request_bot_contribution_async(messages, context['priority'], context.get('deadline'))
+    await in_app_context(store_decision, cache_key, bot_contribution)
+    return bot_contribution
+
+def load_llm_contribution_counts():
+    with current_app._get_current_object().app_context():
+        return count_bot_contributions('llm')
+
+def make_bot_strategy(name):
+    if name == 'llm':
+        return LLMStrategy(llm_decision, async_request_fn=llm_decision_async)
+    return make_strategy(name, counts_loader=load_llm_contribution_counts)
+
+# The LLM answers within a latency budget; when OpenAI is slow or failing, a local
+# policy answers instead and the row records which one did
+bot_strategy = ResilientStrategy(
+    make_bot_strategy(os.getenv('BOT_STRATEGY', 'llm')),
+    make_bot_strategy(os.getenv('BOT_FALLBACK_STRATEGY', 'tit_for_tat')),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv('BREAKER_FAILURES', 3)),
+        cooldown=float(os.getenv('BREAKER_COOLDOWN', 30))
+    ),
+    max_workers=max_decision_workers + max_prefetch_workers
+)
+
+def prefetch_bot_move(flask_app, participant_id, session_num, game_num, context):
+    # Runs on the prefetch executor; only the worker that claims the round asks OpenAI
+    with flask_app.app_context():
+        if not claim_bot_decision(participant_id, session_num, game_num):
+            return None
+
+        with metrics.decisions_in_flight.labels('prefetch').track_inprogress():
+            bot_contribution, source = bot_strategy.decide(context, prefetch_budget)
+
+        # Leave fallback answers to /waiting, which may still reach the primary strategy in time
+        if source != bot_strategy.primary.name:
+            complete_bot_decision(participant_id, session_num, game_num, None, status='failed')
+            return None
+
+        log_event('prefetch', participant_id=participant_id, session_num=session_num, round_num=game_num, bot_contribution=bot_contribution, source=source)
+        if not complete_bot_decision(participant_id, session_num, game_num, bot_contribution, source=source):
+            return recorded_decision(participant_id, session_num, game_num)  # The round was finished without it
+        return bot_contribution, source
+
+def await_prefetched_move(participant_id, session_num, game_num, timeout):
+    # Use this worker's prefetch for the round if it started one
+    deadline = time.monotonic() + timeout
+    future = take_prefetch(decision_key(participant_id, session_num, game_num))
+    if future is not None:
+        try:
+            decision = future.result(timeout=timeout)
+        except Exception:
+            decision = None
+        if decision is not None:
+            return decision
+
+    # Otherwise another worker may have prefetched it, possibly still in flight
+    while True:
+        decision = poll_prefetched_move(participant_id, session_num, game_num)
+        if decision != 'pending':
+            return decision
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.25)
+
+def poll_prefetched_move(participant_id, session_num, game_num):
+    # The recorded prefetch for the round, None if there is none to wait for, or 'pending'
+    db.session.rollback()  # End the transaction so the next read sees other workers' commits
+    decision = get_bot_decision(participant_id, session_num, game_num)
+    if decision is None or decision.status in ('failed', 'deciding'):
+        return None
+    if decision.status == 'ready':
+        return decision.bot_contribution, decision.source
+    return 'pending'
+
+def recorded_decision(participant_id, session_num, game_num):
+    decision = get_bot_decision(participant_id, session_num, game_num)
+    if decision is not None and decision.status == 'ready':
+        return decision.bot_contribution, decision.source
+    return None
+
+def decide_bot_move(flask_app, context, round_data):
+    # Runs on the decision executor, outside of any request, so it gets its own app context
+    with flask_app.app_context(), metrics.decisions_in_flight.labels('decide').track_inprogress():
+        game_num = round_data['round_num']
+        session_num = round_data['session_num']
+        deadline = time.monotonic() + decision_budget
+
+        # A decision that is already recorded (a prefetch, or an earlier visit to /waiting) is
+        # reused, so revisiting a finished round never asks the strategy again
+        if prefetch_enabled:
+            decision = await_prefetched_move(round_data['participant_id'], session_num, game_num, min(prefetch_wait_time, decision_budget))
+        else:
+            decision = recorded_decision(round_data['participant_id'], session_num, game_num)
+
+        if decision is None:
+            decision = bot_strategy.decide(context, deadline - time.monotonic())
+        bot_contribution, source = decision
+
+        finish_round(round_data, bot_contribution, source)
+        return bot_contribution
+
+def finish_round(round_data, bot_contribution, source):
+    game_num = round_data['round_num']
+    session_num = round_data['session_num']
+
+    # Record the decision so duplicate requests and /outcome can pick it up. If another worker
+    # recorded one first, the round is saved with that one, so both tables agree.
+    if not complete_bot_decision(round_data['participant_id'], session_num, game_num, bot_contribution, source=source):
+        decision = recorded_decision(round_data['participant_id'], session_num, game_num)
+        if decision is not None:
+            bot_contribution, source = decision
+
+    log_event('decision', participant_id=round_data['participant_id'], session_num=session_num, round_num=game_num,
+              bot_contribution=bot_contribution, source=source)
+    metrics.bot_decisions.labels(source).inc()
+    save_round_result(round_data, bot_contribution, source)
+
+async def prefetch_bot_move_async(flask_app, participant_id, session_num, game_num, context):
+    # Runs on the decision loop, like decide_bot_move_async
+    with flask_app.app_context():
+        if not await in_app_context(claim_bot_decision, participant_id, session_num, game_num):
+            return None
+
+        with metrics.decisions_in_flight.labels('prefetch').track_inprogress():
+            bot_contribution, source = await bot_strategy.decide_async(context, prefetch_budget)
+
+        if source != bot_strategy.primary.name:
+            await in_app_context(complete_bot_decision, participant_id, session_num, game_num, None, 'failed')
+            return None
+
+        log_event('prefetch', participant_id=participant_id, session_num=session_num, round_num=game_num, bot_contribution=bot_contribution, source=source)
+        if not await in_app_context(complete_bot_decision, participant_id, session_num, game_num, bot_contribution, 'ready', source):
+            return await in_app_context(recorded_decision, participant_id, session_num, game_num)
+        return bot_contribution, source
+
+async def await_prefetched_move_async(participant_id, session_num, game_num, timeout):
+    deadline = time.monotonic() + timeout
+    future = take_prefetch(decision_key(participant_id, session_num, game_num))
+    if future is not None:
+        try:
+            decision = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except Exception:
+            decision = None
+        if decision is not None:
+            return decision
+
+    while True:
+        decision = await in_app_context(poll_prefetched_move, participant_id, session_num, game_num)
+        if decision != 'pending':
+            return decision
+        if time.monotonic() >= deadline:
+            return None
+        await asyncio.sleep(0.25)
+
+async def decide_bot_move_async(flask_app, context, round_data):
+    # Runs on the decision loop; in_app_context() finds the app through this context
+    with flask_app.app_context(), metrics.decisions_in_flight.labels('decide').track_inprogress():
+        participant_id, session_num, game_num = round_data['participant_id'], round_data['session_num'], round_data['round_num']
+        deadline = time.monotonic() + decision_budget
+
+        if prefetch_enabled:
+            decision = await await_prefetched_move_async(participant_id, session_num, game_num, min(prefetch_wait_time, decision_budget))
+        else:
+            decision = await in_app_context(recorded_decision, participant_id, session_num, game_num)
+
+        if decision is None:
+            decision = await bot_strategy.decide_async(context, deadline - time.monotonic())
+        bot_contribution, source = decision
+
+        await in_app_context(finish_round, round_data, bot_contribution, source)
+        return bot_contribution
+
+if decision_mode == 'async':
+    decide_move, prefetch_move = decide_bot_move_async, prefetch_bot_move_async
+else:
+    decide_move, prefetch_move = decide_bot_move, prefetch_bot_move
+
+def save_round_result(round_data, bot_contribution, source):
+    contribution = round_data['contribution']
+    score, _, group_account = round_payoffs(contribution, bot_contribution)
+
+    # Idempotent: returns False when the round was already saved
+    return save_participant_data(
+        bot_contribution=bot_contribution,
+        participant_balance=score,
+        bot_balance=group_account - score,  # Recorded as it always has been
+        net_gain=group_account / 2,
+        end_timestamp=None,
+        decision_source=source,
+        **round_data
+    )
+
+def current_round_data():
+    # Everything needed to save the current round, captured from the request session
+    return {
+        'prolific_pid': session.get('prolific_pid'),
+        'session_id': session.get('session_id'),
+        'participant_id': session['participant_id'],
+        'session_num': session.get('session_num', 1),
+        'round_num': session.get('game', 1),
+        'contribution': session.get('current_contribution', 0),
+        'group': session.get('group'),
+        'start_timestamp': session.get('start_timestamp')
     }
 
-    # Add the system message only once at the start
-    if not session.get('system_message_added'):
-        previous_messages.insert(0, system_message)  # Add it at the beginning of the conversation
-        session['system_message_added'] = True  # Mark that the system message was added
+@study.route('/waiting')
+def waiting():
+    game_num = session['game']
+    session_num = session['session_num']
+    participant_id = session['participant_id']
+    group = session['group']
 
-    try:
-        # Send the entire conversation history (few-shot prompting)
-        completion = client.chat.completions.create(
-            model="gpt-4o",
-            messages=previous_messages
+    # Only one worker finishes a round; a refresh or double submit attaches to it instead.
+    # Hand the decision to the pool and let the page poll for the result. A round that is
+    # already saved needs no check here: its recorded decision is reused and the insert is a
+    # no-op, and the status poll sends the participant straight on to the outcome.
+    key = decision_key(participant_id, session_num, game_num)
+    if decision_status(key) is None and claim_round(participant_id, session_num, game_num, worker_id(), round_lease_time):
+        submit_decision(
+            key,
+            decide_move, current_app._get_current_object(), build_decision_context(participant_id, session_num, game_num, group), current_round_data()
         )
-        bot_contribution = int(completion.choices[0].message.content.strip())
-
-        print(f"(API) AI Contribution (Game {game_num}, Session {session_num}): {bot_contribution}")
-
-        # Calculate results
-        total_contribution = contribution + bot_contribution
-        if total_contribution >= 10:
-            total_contribution *= 1.5
 
-        private_account = 10 - contribution
-        score = private_account + (total_contribution / 2)
+    return render_template('waiting.html', wait_time=decision_wait_time)
 
-        # Log game history
-        game_history.append({
-            'game_num': game_num,
-            'human_contribution': contribution,
-            'bot_contribution': bot_contribution,
-            'score': score,
-            'session_num': session_num  # Include session number in each game record
-        })
-        session['game_history'] = game_history
-
-        session['participant_balance'] = score
-        session['bot_contribution'] = bot_contribution
+@study.route('/waiting/status')
+def waiting_status():
+    participant_id = session['participant_id']
+    session_num = session.get('session_num', 1)
+    game = session.get('game', 1)
 
-        # Save the updated assistant message to the conversation history
-        previous_messages.append({
-            "role": "assistant",
-            "content": str(bot_contribution)
-        })
-        session['previous_messages'] = previous_messages  # Save the conversation in the session
+    status = decision_status(decision_key(participant_id, session_num, game))
 
-        # Save the participant data as before
-        save_participant_data(
-            prolific_pid=prolific_pid,
-            session_id=session_id,
+    # The decision may have been started by another worker, so fall back to the saved row
+    if status is None:
+        existing_entry = Participant.query.filter_by(
             participant_id=participant_id,
             session_num=session_num,
-            round_num=game_num,
-            contribution=contribution,
-            bot_contribution=bot_contribution,
-            participant_balance=score,
-            bot_balance=total_contribution - score,
-            net_gain=score - private_account,
-            group=group,
-            start_timestamp=session.get('start_timestamp'),
-            end_timestamp=None,
-            incom_1=incom_1,
-            incom_2=incom_2,
-            incom_3=incom_3,
-            incom_4=incom_4,
-            incom_5=incom_5,
-            incom_6=incom_6
-        )
-
-        # Redirect to outcome without incrementing game count here
-        return redirect(url_for('outcome'))
+            round_num=game
+        ).first()
+        if existing_entry:
+            status = 'ready'
+        elif round_claim_active(participant_id, session_num, game):
+            status = 'pending'
+        else:
+            # Nobody is working on this round (e.g. its worker restarted); reload /waiting to claim it
+            status = 'retry'
+
+    return jsonify(status=status)
+
+# Optional bearer token for /metrics and /scheduler/status, for deployments where they are publicly reachable
+metrics_token = os.getenv('METRICS_TOKEN')
+
+def check_metrics_token():
+    # Operational endpoints answer 404 without "Authorization: Bearer <METRICS_TOKEN>" when it is set
+    if metrics_token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not secrets.compare_digest(supplied, metrics_token):
+            abort(404)
+
+@study.route('/metrics')
+def metrics_endpoint():
+    # Prometheus text format, summed over all gunicorn workers
+    check_metrics_token()
+    body, content_type = metrics.metrics_text()
+    return Response(body, content_type=content_type)
+
+@study.route('/scheduler/status')
+def scheduler_status():
+    # Shared OpenAI queue depth and wait times
+    check_metrics_token()
+    if scheduler is None:
+        return jsonify(enabled=False)
+    return jsonify(enabled=True, **scheduler.stats())
+
+# Token for /export; the endpoint is disabled when EXPORT_TOKEN is not set
+export_token = os.getenv('EXPORT_TOKEN')
+
+def export_filters(start, end, group, completed):
+    return {'start': start, 'end': end, 'group': group or None, 'completed': completed}
+
+@study.route('/export/<kind>.csv')
+def export_csv(kind):
+    # Streams the dataset as CSV: /export/rounds.csv or /export/sessions.csv with optional
+    # ?start=, ?end= (ISO dates), ?group= and ?completed=1|0, sent with "Authorization: Bearer <token>"
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not export_token or not secrets.compare_digest(supplied, export_token):
+        abort(404)
+    if kind not in ('rounds', 'sessions'):
+        abort(404)
 
-    except Exception as e:
-        print(f"Error occurred during API call: {e}")
-        return redirect(url_for('outcome'))
-
-@app.route('/outcome')
+    try:
+        start = datetime.datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = datetime.datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        abort(400)
+    completed = {'1': True, '0': False}.get(request.args.get('completed'))
+
+    statement = export_statement(kind, **export_filters(start, end, request.args.get('group'), completed))
+    return Response(
+        stream_with_context(iter_csv(statement)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={kind}.csv'}
+    )
+
+@study.route('/outcome')
 def outcome():
-    prolific_pid = session.get('prolific_pid')  # Retrieve from session
-    session_id = session.get('session_id')      # Retrieve from session
-
-    # Retrieve INCOM values from session, default to None if not set
-    incom_1 = session.get('incom_1', None)
-    incom_2 = session.get('incom_2', None)
-    incom_3 = session.get('incom_3', None)
-    incom_4 = session.get('incom_4', None)
-    incom_5 = session.get('incom_5', None)
-    incom_6 = session.get('incom_6', None)
     # Get current game and session numbers
     game = session.get('game', 1)
     session_num = session.get('session_num', 1)
     participant_id = session['participant_id']
 
-    # Check if the data for this game already exists in the database
+    # Keep the participant on the waiting page while this worker is still deciding
+    key = decision_key(participant_id, session_num, game)
+    if decision_status(key) == 'pending':
+        return redirect(url_for('study.waiting'))
+    pop_decision(key)
+
+    # Read the saved round to show it
     existing_entry = Participant.query.filter_by(
         participant_id=participant_id,
         session_num=session_num,
         round_num=game
     ).first()
 
+    # A decision may have landed without its row being saved, e.g. if its worker restarted
     if not existing_entry:
-        try:
-            # If not exists, save the data as before
-            save_participant_data(
-                prolific_pid=prolific_pid,
-                session_id=session_id,
-                participant_id=participant_id,
-                session_num=session_num,
-                round_num=game,
-                contribution=session.get('current_contribution', 0),
-                bot_contribution=session.get('bot_contribution', 0),
-                participant_balance=session.get('participant_balance', 10),
-                bot_balance=session.get('bot_contribution', 0),
-                net_gain=session.get('net_gain', 0),
-                group=session.get('group'),
-                start_timestamp=session.get('start_timestamp'),
-                end_timestamp=None,
-                incom_1=incom_1,  # Pass incom values
-                incom_2=incom_2,
-                incom_3=incom_3,
-                incom_4=incom_4,
-                incom_5=incom_5,
-                incom_6=incom_6
-            )
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-            return redirect(url_for('game'))  # Safely redirect to avoid errors
+        decision = recorded_decision(participant_id, session_num, game)
+        if decision is not None:
+            save_round_result(current_round_data(), *decision)
+        elif round_claim_active(participant_id, session_num, game):
+            return redirect(url_for('study.waiting'))  # Another worker is still deciding this round
+        else:
+            # Nobody decided this round (e.g. /outcome was opened directly): the fallback answers
+            context = build_decision_context(participant_id, session_num, game, session.get('group'))
+            finish_round(current_round_data(), bot_strategy.fallback.decide(context), bot_strategy.fallback.name)
+        existing_entry = Participant.query.filter_by(
+            participant_id=participant_id,
+            session_num=session_num,
+            round_num=game
+        ).first()
+
+    if not existing_entry:
+        # The round could not be saved; /waiting decides it again
+        return redirect(url_for('study.waiting'))
+
+    # Record the decided round in the session the first time its outcome is shown
+    conversation = get_conversation(participant_id)
+    game_history = conversation['game_history']
+    if not any(game_info['game_num'] == game and game_info.get('session_num') == session_num for game_info in game_history):
+        game_history.append({
+            'game_num': game,
+            'human_contribution': existing_entry.contribution,
+            'bot_contribution': existing_entry.bot_contribution,
+            'score': existing_entry.participant_balance,
+            'session_num': session_num  # Include session number in each game record
+        })
+        put_conversation(participant_id, conversation)
+
+        session['participant_balance'] = existing_entry.participant_balance
+        session['bot_contribution'] = existing_entry.bot_contribution
 
     # Remove any redundant logic here
     resp = make_response(render_template(
@@ -373,7 +771,7 @@ def outcome():
     
     return resp
 
-@app.route('/continue_after_outcome')
+@study.route('/continue_after_outcome')
 def continue_after_outcome():
     session_num = session.get('session_num', 1)
     game = session.get('game', 1)
@@ -386,19 +784,26 @@ def continue_after_outcome():
 
         # Determine the next route (message or average_message) based on the group
         next_route = 'message' if session['group'] == 'control' else 'average_message'
-        return redirect(url_for(next_route))
+        return redirect(url_for(f'study.{next_route}'))
 
     # Check if we are at the end of Session 2
     elif session_num == 2 and game == total_games:
         # End of Session 2, redirect to the results
-        return redirect(url_for('result'))
+        return redirect(url_for('study.result'))
 
     # For games 1 to 9, or games in Session 2 before the last game
     else:
         session['game'] += 1  # Increment the game count
-        return redirect(url_for('game'))  # Continue to the next game
+        return redirect(url_for('study.game'))  # Continue to the next game
+
+def participant_bonus(summaries):
+    # Bonus in USD from the {session_num: SessionSummary} totals of a participant
+    total_tokens_earned = sum(summary.participant_balance_sum for summary in summaries.values())
+    games_played = sum(summary.rounds for summary in summaries.values())
+    average_tokens_earned_per_game = total_tokens_earned / games_played if games_played else 0
+    return float(bonus_usd(average_tokens_earned_per_game))
 
-@app.route('/result')
+@study.route('/result')
 def result():
     participant_id = session['participant_id']
     session_num = session.get('session_num', 1)
@@ -406,53 +811,27 @@ def result():
     # Set the end timestamp at the time of result loading
     end_timestamp = datetime.datetime.now(datetime.UTC)
 
-    # Update the end_timestamp in the database for each game of this participant
-    games_to_update = Participant.query.filter_by(
-        participant_id=participant_id,
-        session_num=session_num
-    ).all()
-
-    for game in games_to_update:
-        game.end_timestamp = end_timestamp
-
-    db.session.commit()  # Commit all changes
-
-    # Retrieve all games across both sessions (1 and 2)
-    all_games = Participant.query.filter_by(participant_id=participant_id).all()
-
-    # Calculate the total earnings in tokens across all games
-    total_tokens_earned = sum(game.participant_balance for game in all_games)
-
-    # Calculate the average earnings in tokens per game
-    average_tokens_earned_per_game = total_tokens_earned / len(all_games) if all_games else 0
+    # Running totals for both sessions (1 and 2), then one UPDATE stamping this session's games
+    summaries = get_session_summaries(participant_id)
+    bonus = participant_bonus(summaries)
+    finalize_participant(participant_id, end_timestamp, bonus, session_num=session_num)
 
-    # Convert the average earnings to USD (1 USD for 15 tokens, plus a base value of 1.58 USD)
-    bonus = (average_tokens_earned_per_game / 15)
-    earnings_in_usd = 1.61 + bonus
+    # Convert the average earnings to USD (1 USD for 15 tokens, plus a base value of 1.61 USD)
+    # and round to 2 decimal places for display
+    earnings_in_usd = round(earnings_usd(bonus), 2)
 
-    # Round earnings to 2 decimal places for display
-    earnings_in_usd = round(earnings_in_usd, 2)
-
-    # Update the bonus field in the Participant records
-    for game in games_to_update:
-        game.bonus = bonus
-
-    db.session.commit()  # Commit the bonus updates to the database
-
-    # Calculate averages for AI and human player contributions for each session
-    session_1_games = Participant.query.filter_by(participant_id=participant_id, session_num=1).all()
-    session_2_games = Participant.query.filter_by(participant_id=participant_id, session_num=2).all()
-
-    # Calculate the average contributions for session 1 and session 2
-    session_1_human_avg_contribution = round(sum(game.contribution for game in session_1_games) / len(session_1_games), 1) if session_1_games else 0
-    session_2_human_avg_contribution = round(sum(game.contribution for game in session_2_games) / len(session_2_games), 1) if session_2_games else 0
-    session_1_ai_avg_contribution = round(sum(game.bot_contribution for game in session_1_games) / len(session_1_games), 1) if session_1_games else 0
-    session_2_ai_avg_contribution = round(sum(game.bot_contribution for game in session_2_games) / len(session_2_games), 1) if session_2_games else 0
+    # Average contributions for session 1 and session 2
+    session_1 = summaries.get(1)
+    session_2 = summaries.get(2)
+    session_1_human_avg_contribution = round(session_1.human_avg_contribution, 1) if session_1 else 0
+    session_2_human_avg_contribution = round(session_2.human_avg_contribution, 1) if session_2 else 0
+    session_1_ai_avg_contribution = round(session_1.ai_avg_contribution, 1) if session_1 else 0
+    session_2_ai_avg_contribution = round(session_2.ai_avg_contribution, 1) if session_2 else 0
 
     # Render the results page with game history and earnings
     resp = make_response(render_template(
         'result.html',
-        game_history=session.get('game_history', []),
+        game_history=get_conversation(participant_id)['game_history'],
         session_1_human_avg_contribution=session_1_human_avg_contribution,
         session_2_human_avg_contribution=session_2_human_avg_contribution,
         session_1_ai_avg_contribution=session_1_ai_avg_contribution,
@@ -467,7 +846,7 @@ def result():
     
     return resp
 
-@app.route('/message')
+@study.route('/message')
 def message():
     # Retrieve the current session number
     session_num = session.get('session_num', 1)
@@ -483,28 +862,32 @@ def message():
 
     return resp
 
-@app.route('/average_message')
+@study.route('/average_message')
 def average_message():
     session_num = session.get('session_num', 1)
     participant_id = session['participant_id']  # Retrieve participant ID from session
 
+    # Baselines for the session just played by the participant's group
+    historic_human_avg_contribution, historic_ai_avg_contribution = historic_averages(session.get('group'), session_num - 1)
+
     # Calculate human averages and divergence
     human_avg_contribution = round(calculate_human_player_average(participant_id), 1)
-    historic_human_avg_contribution = 8.1
     human_divergence = round(float(human_avg_contribution) - historic_human_avg_contribution, 1)
 
     # Calculate AI contributions for the current session
     ai_avg_contribution = round(calculate_ai_player_average(participant_id), 1)
-    historic_ai_avg_contribution = 8.1
     ai_divergence = round(float(ai_avg_contribution) - historic_ai_avg_contribution, 1)
 
     # Log the calculated averages and divergences
-    print(f"Human Avg Contribution (Session {session_num}): {human_avg_contribution}")
-    print(f"AI Avg Contribution (Session {session_num}): {ai_avg_contribution}")
-    print(f"Historic Human Avg Contribution: {historic_human_avg_contribution}")
-    print(f"Historic AI Avg Contribution: {historic_ai_avg_contribution}")
-    print(f"Human Divergence: {human_divergence}")
-    print(f"AI Divergence: {ai_divergence}")
+    log_event(
+        'session_averages',
+        human_avg_contribution=human_avg_contribution,
+        ai_avg_contribution=ai_avg_contribution,
+        historic_human_avg_contribution=historic_human_avg_contribution,
+        historic_ai_avg_contribution=historic_ai_avg_contribution,
+        human_divergence=human_divergence,
+        ai_divergence=ai_divergence
+    )
 
     # Render the template with the calculated data
     resp = make_response(render_template(
@@ -525,7 +908,7 @@ def average_message():
 
     return resp
 
-@app.route('/incom', methods=['GET', 'POST'])
+@study.route('/incom', methods=['GET', 'POST'])
 def incom():
     if request.method == 'POST':
         # Retrieve form data
@@ -537,7 +920,7 @@ def incom():
         incom_6 = request.form.get('incom_6')
 
         # Debugging: log incom values to check if they are being retrieved correctly
-        print(f"INCOM values: incom_1={incom_1}, incom_2={incom_2}, incom_3={incom_3}, incom_4={incom_4}, incom_5={incom_5}, incom_6={incom_6}")
+        log_event('questionnaire', incom_1=incom_1, incom_2=incom_2, incom_3=incom_3, incom_4=incom_4, incom_5=incom_5, incom_6=incom_6)
 
         # Ensure all questions are answered
         if not all([incom_1, incom_2, incom_3, incom_4, incom_5, incom_6]):
@@ -547,22 +930,26 @@ def incom():
         # Reverse-code incom_3 (e.g., 5 becomes 1, 4 becomes 2, etc.)
         incom_3_reversed = 6 - int(incom_3)
 
-        # Save the data to the session for now
-        session['incom_1'] = incom_1
-        session['incom_2'] = incom_2
-        session['incom_3'] = incom_3_reversed  # Save reversed
-        session['incom_4'] = incom_4
-        session['incom_5'] = incom_5
-        session['incom_6'] = incom_6
-
-        # Debugging: log session data
-        print(f"Session INCOM values: {session.get('incom_1')}, {session.get('incom_2')}, {session.get('incom_3')}, {session.get('incom_4')}, {session.get('incom_5')}, {session.get('incom_6')}")
+        # Store the answers once, in their own table, instead of carrying them in the session
+        if 'participant_id' not in session:
+            session['participant_id'] = secrets.token_hex(8)
+        save_questionnaire(session['participant_id'], session.get('prolific_pid'), session.get('session_id'), {
+            'incom_1': int(incom_1),
+            'incom_2': int(incom_2),
+            'incom_3': incom_3_reversed,  # Save reversed
+            'incom_4': int(incom_4),
+            'incom_5': int(incom_5),
+            'incom_6': int(incom_6)
+        })
 
         # Redirect to the next page
-        return redirect(url_for('questions'))  # Redirect to the next step
-    return render_template('incom.html')
+        return redirect(url_for('study.questions'))  # Redirect to the next step
+    return page_response('incom.html')
+
+# Accepted spellings of the control question answers, e.g. 12.5, 12,5, 12.50 and 12,50
+answer_key = control_answer_key()
 
-@app.route('/questions', methods=['GET', 'POST'])
+@study.route('/questions', methods=['GET', 'POST'])
 def questions():
     if request.method == 'POST':
         # Check answers from form submission
@@ -571,26 +958,198 @@ def questions():
         answer3 = request.form.get('answer3')
         answer4 = request.form.get('answer4')
 
-        # Correct answers
-        correct_answers = {
-            'answer1': ['12.5', '12,5', '12.50', '12,50'],
-            'answer2': ['7.5', '7,5', '7.50', '7,50'],
-            'answer3': ['10.25', '10,25'],
-            'answer4': ['10']
-        }
+        # Correct answers, worked out from the game rules
+        correct_answers = answer_key
 
         # Verify answers
         if (answer1 in correct_answers['answer1'] and 
             answer2 in correct_answers['answer2'] and
             answer3 in correct_answers['answer3'] and
             answer4 in correct_answers['answer4']):
-            return redirect(url_for('start'))  # Redirect to the first session if answers are correct
+            return redirect(url_for('study.start'))  # Redirect to the first session if answers are correct
 
-    resp = make_response(render_template('questions.html'))
+    resp = page_response('questions.html', answer_key=answer_key)
 
     # Set cookies for last visited page, game number, and session number
     resp.set_cookie('last_page', 'questions', max_age=3600)
     return resp
 
+# Pages served from the render cache, with their (fixed) template context
+static_pages = {
+    'welcome.html': {},
+    'instructions.html': {},
+    'incom.html': {},
+    'questions.html': {'answer_key': answer_key},
+    'cookies_required.html': {}
+}
+
+# Database connections each worker opens before it takes traffic
+warmup_db_connections = int(os.getenv('WARMUP_DB_CONNECTIONS', 2))
+
+def warm_up(flask_app):
+    # Runs in every worker before it accepts requests (post_worker_init in gunicorn.conf.py):
+    # opens database connections and the OpenAI connection, compiles the templates and fills
+    # the render cache, so the first participants a fresh worker serves do not pay for them
+    started = time.perf_counter()
+    opened = 0
+    try:
+        with flask_app.app_context():
+            # With --preload the engine was built before the fork; this worker starts its own
+            # pool instead of sharing the master's connections
+            db.engine.dispose(close=False)
+            connections = [db.engine.connect() for _ in range(warmup_db_connections)]
+            for connection in connections:
+                connection.execute(text('SELECT 1'))
+                connection.close()  # Back to the pool, still open
+                opened += 1
+    except Exception as e:
+        log_error('warm_up_error', f"Could not open database connections: {e}")
+
+    for name in flask_app.jinja_env.list_templates(extensions=['html']):
+        flask_app.jinja_env.get_template(name)
+    with flask_app.test_request_context():
+        for template, context in static_pages.items():
+            cached_page(template, **context)
+
+    openai_connected = None
+    if bot_strategy.primary.name == 'llm':
+        if decision_mode == 'async':
+            warm_async = asyncio.run_coroutine_threadsafe(get_async_client_ready(), event_loop())
+            openai_connected = warm_async.result()
+        else:
+            openai_connected = get_client().warm_up()
+
+    log_event('worker_ready', latency_ms=round((time.perf_counter() - started) * 1000, 1),
+              db_connections=opened, openai_connected=openai_connected)
+
+@study.cli.command('finalize-stragglers')
+@click.option('--idle-hours', default=24.0, show_default=True, help='Only participants who started at least this long ago.')
+def finalize_stragglers(idle_hours):
+    # Record the bonus of participants who left before reaching /result; their end_timestamp
+    # stays empty, so they are still not counted as having completed the study
+    cutoff = datetime.datetime.now(datetime.UTC).replace(tzinfo=None) - datetime.timedelta(hours=idle_hours)
+    participant_ids = unfinalized_participants(cutoff)
+    for participant_id in participant_ids:
+        bonus = participant_bonus(get_session_summaries(participant_id))
+        updated = record_dropout_bonus(participant_id, bonus)
+        print(f"Finalized {updated} rounds of participant {participant_id} (bonus {bonus:.2f} USD)")
+    print(f"Finalized {len(participant_ids)} participants")
+
+@study.cli.command('seed-historic-averages')
+@click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+def seed_historic_averages(csv_path):
+    # Load baseline averages from earlier studies (group, session_num, human_avg_contribution, ai_avg_contribution[, rounds])
+    print(f"Seeded {seed_from_csv(csv_path)} historic averages from {csv_path}")
+
+@study.cli.command('refresh-historic-averages')
+def refresh_historic_averages():
+    # Recompute this study's baselines from participants who reached the result page
+    print(f"Wrote {recompute_study_averages()} historic averages")
+
+@study.cli.command('export')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--kind', type=click.Choice(['rounds', 'sessions']), default='rounds', show_default=True, help='One row per round, or per participant session with aggregates.')
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'parquet']), default=None, help='Defaults to the file extension.')
+@click.option('--start', type=click.DateTime(), default=None, help='Participants who started on or after this time.')
+@click.option('--end', type=click.DateTime(), default=None, help='Participants who started before this time.')
+@click.option('--group', default=None, help='Only this group.')
+@click.option('--completed/--incomplete', default=None, help='Only participants who did or did not reach the result page.')
+def export(path, kind, file_format, start, end, group, completed):
+    # Write the dataset to a file without loading it into memory
+    statement = export_statement(kind, **export_filters(start, end, group, completed))
+    file_format = file_format or ('parquet' if path.endswith('.parquet') else 'csv')
+    if file_format == 'parquet':
+        try:
+            rows = write_parquet(statement, path)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        print(f"Exported {rows} rows to {path}")
+    else:
+        write_csv(statement, path)
+        print(f"Exported {kind} to {path}")
+
+@study.cli.command('simulate')
+@click.option('--human', 'human_spec', default='random', show_default=True, help="Human policy: fixed:N, random[:LOW:HIGH] or tit_for_tat[:OPENING].")
+@click.option('--bot', 'bot_spec', default='empirical', show_default=True, help="Bot policy, or 'empirical' for the LLM bot's recorded moves.")
+@click.option('--participants', default=1000000, show_default=True)
+@click.option('--games', default=total_games * total_sessions, show_default=True)
+@click.option('--threshold', default=game_engine.threshold, show_default=True)
+@click.option('--multiplier', default=game_engine.multiplier, show_default=True)
+@click.option('--tokens-per-usd', default=game_engine.tokens_per_usd, show_default=True)
+@click.option('--base-payment', default=game_engine.base_payment_usd, show_default=True)
+@click.option('--seed', default=None, type=int)
+def simulate(human_spec, bot_spec, participants, games, threshold, multiplier, tokens_per_usd, base_payment, seed):
+    # Play a large simulated population and summarize scores and payments under the given rules
+    import numpy as np
+    import simulation
+
+    if bot_spec == 'empirical':
+        counts = count_bot_contributions('llm')
+        if not counts:
+            raise click.ClickException("No LLM bot contributions recorded yet; pick another --bot policy")
+        bot_policy = simulation.empirical_policy(counts)
+    else:
+        bot_policy = simulation.make_policy(bot_spec)
+
+    started = time.perf_counter()
+    outcome = simulation.simulate(
+        simulation.make_policy(human_spec), bot_policy,
+        participants=participants, games=games, seed=seed,
+        threshold=threshold, multiplier=multiplier,
+        tokens_per_usd=tokens_per_usd, base_payment_usd=base_payment
+    )
+    elapsed = time.perf_counter() - started
+
+    earnings = outcome['earnings_usd']
+    print(f"Simulated {participants * games} rounds in {elapsed:.2f}s")
+    print(f"Human score per game: {outcome['score'].mean():.2f}, bot score per game: {outcome['bot_score'].mean():.2f}")
+    print(f"Human contribution: {outcome['contribution'].mean():.2f}, bot contribution: {outcome['bot_contribution'].mean():.2f}")
+    print(f"Earnings (USD): mean {earnings.mean():.2f}, p5 {np.percentile(earnings, 5):.2f}, p95 {np.percentile(earnings, 95):.2f}, "
+          f"total {earnings.sum():.2f}")
+
+@study.cli.command('replay')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--bot', 'strategy_name', default='tit_for_tat', show_default=True, help="llm (against OPENAI_BASE_URL), tit_for_tat, fixed or empirical.")
+@click.option('--workers', default=None, type=int, help='Worker processes; defaults to the number of cores.')
+@click.option('--start', type=click.DateTime(), default=None, help='Participants who started on or after this time.')
+@click.option('--end', type=click.DateTime(), default=None, help='Participants who started before this time.')
+@click.option('--group', default=None, help='Only this group.')
+@click.option('--completed/--incomplete', default=None, help='Only participants who did or did not reach the result page.')
+def replay_sessions(path, strategy_name, workers, start, end, group, completed):
+    # Replay recorded human contributions against another bot strategy into a Parquet (or .csv) file
+    from replay import recorded_participants, replay
+
+    settings = {
+        'total_games': total_games,
+        'historic_ai_avg': {name: historic_averages(name, 1)[1] for name in ('control', 'experimental')},
+        'default_historic_ai_avg': historic_averages()[1]
+    }
+    if strategy_name == 'empirical':
+        settings['bot_counts'] = count_bot_contributions('llm')
+
+    started = time.perf_counter()
+    participants = recorded_participants(total_games, **export_filters(start, end, group, completed))
+    try:
+        replayed, rounds = replay(participants, strategy_name, path, workers=workers, settings=settings)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    print(f"Replayed {replayed} participants ({rounds} rounds) against {strategy_name} in {time.perf_counter() - started:.1f}s into {path}")
+
+@study.cli.command('build-assets')
+@click.option('--fonts-from', 'font_dir', type=click.Path(exists=True, file_okay=False), default=None, help='Re-subset the Roboto TTFs in this directory into assets/fonts first.')
+def build_static_assets(font_dir):
+    # Copy assets/ into static/ under content-hashed names and write static/manifest.json
+    if font_dir:
+        try:
+            print(f"Subset {', '.join(assets.subset_fonts(font_dir))}")
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+    manifest = assets.build_assets(current_app.static_folder)
+    print(f"Built {len(manifest)} assets into {current_app.static_folder}")
+
+
+# gunicorn serves app:app
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=os.getenv("DEBUG", "False") == "True")
@@ -0,0 +1,135 @@
+import os
+import json
+import hashlib
+import posixpath
+import re
+from flask import url_for, request
+
+
+# Stylesheets, scripts and fonts are kept in assets/ and copied by `flask build-assets` into
+# static/ under content-hashed names (css/welcome.css -> css/welcome.1f2e3d4c5b.css), with
+# static/manifest.json mapping one to the other. A hashed file never changes, so browsers may
+# keep it for a year without asking again, and a new build gives changed files new URLs.
+# Run the build after editing anything in assets/ and commit static/ with it.
+source_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+manifest_name = 'manifest.json'
+asset_extensions = ('.css', '.js', '.woff2')
+immutable_max_age = 365 * 24 * 3600
+
+# Fonts are cut down to Latin-1 and the punctuation the pages use (dashes, curly quotes, ...)
+font_unicodes = 'U+0000-00FF,U+0131,U+0152-0153,U+02C6,U+02DA,U+02DC,U+2013-2014,U+2018-201A,U+201C-201E,U+2022,U+2026,U+20AC,U+2122'
+font_files = {'Roboto-Regular.ttf': 'roboto-400.woff2', 'Roboto-Bold.ttf': 'roboto-700.woff2'}
+
+css_url = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+_manifest = {}
+_hashed = set()
+
+
+def hashed_name(name, data):
+    stem, extension = posixpath.splitext(name)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:10]}{extension}'
+
+
+def _rewrite_urls(name, css, manifest):
+    # Points url(...) references to other assets (fonts) at their hashed names
+    directory = posixpath.dirname(name)
+
+    def replace(match):
+        target = posixpath.normpath(posixpath.join(directory, match.group(2)))
+        if target not in manifest:  # data: URIs, absolute URLs
+            return match.group(0)
+        return f'url({posixpath.relpath(manifest[target], directory or ".")})'
+
+    return css_url.sub(replace, css)
+
+
+def read_manifest(target):
+    try:
+        with open(os.path.join(target, manifest_name)) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return {}
+
+
+def build_assets(target, source=source_folder):
+    # Writes a hashed copy of every asset in source to target, removes the files of the
+    # previous build that are no longer used, and returns the new manifest
+    names = []
+    for directory, _, filenames in os.walk(source):
+        for filename in filenames:
+            if filename.endswith(asset_extensions):
+                names.append(os.path.relpath(os.path.join(directory, filename), source).replace(os.sep, '/'))
+    # Stylesheets last, so the files they refer to already have their hashed names
+    names.sort(key=lambda name: (name.endswith('.css'), name))
+
+    previous = read_manifest(target)
+    manifest = {}
+    for name in names:
+        with open(os.path.join(source, name), 'rb') as asset:
+            data = asset.read()
+        if name.endswith('.css'):
+            data = _rewrite_urls(name, data.decode('utf-8'), manifest).encode('utf-8')
+        manifest[name] = hashed_name(name, data)
+        path = os.path.join(target, manifest[name])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as built:
+            built.write(data)
+
+    for stale in set(previous.values()) - set(manifest.values()):
+        try:
+            os.remove(os.path.join(target, stale))
+        except FileNotFoundError:
+            pass
+
+    with open(os.path.join(target, manifest_name), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+        manifest_file.write('\n')
+    return manifest
+
+
+def subset_fonts(font_dir, target=os.path.join(source_folder, 'fonts')):
+    # Writes WOFF2 subsets of the Roboto TTFs in font_dir into assets/fonts. Needs fontTools
+    # (and brotli for WOFF2), which only this step uses; the app serves the committed output.
+    try:
+        from fontTools import subset
+    except ImportError:
+        raise RuntimeError("Subsetting fonts needs fontTools; install fonttools and brotli")
+
+    options = subset.Options()
+    options.flavor = 'woff2'
+    options.layout_features = ['kern', 'liga']
+    options.name_IDs = [0, 1, 2, 3, 4, 5, 6, 13, 14]  # Keep the copyright and licence entries
+    written = []
+    for filename, output in font_files.items():
+        font = subset.load_font(os.path.join(font_dir, filename), options)
+        subsetter = subset.Subsetter(options)
+        subsetter.populate(unicodes=subset.parse_unicodes(font_unicodes))
+        subsetter.subset(font)
+        subset.save_font(font, os.path.join(target, output), options)
+        written.append(output)
+    return written
+
+
+def asset_url(name):
+    # URL of the hashed build of an asset, e.g. asset_url('css/welcome.css'); falls back to
+    # the plain name for a file that was added to assets/ but not built yet
+    return url_for('static', filename=_manifest.get(name, name))
+
+
+def _cache_forever(response):
+    if request.endpoint == 'static' and response.status_code in (200, 304) \
+            and (request.view_args or {}).get('filename') in _hashed:
+        response.cache_control.no_cache = None  # Flask's default for static files
+        response.cache_control.public = True
+        response.cache_control.max_age = immutable_max_age
+        response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    # asset_url() for templates, and long-lived cache headers on the hashed files
+    _manifest.update(read_manifest(app.static_folder))
+    _hashed.update(_manifest.values())
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.after_request(_cache_forever)
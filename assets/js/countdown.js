@@ -0,0 +1,18 @@
+// Countdown and button activation
+let countdown = 15;
+const countdownElement = document.getElementById('countdown');
+const continueButton = document.getElementById('continueButton');
+
+const timer = setInterval(() => {
+    countdown--;
+    countdownElement.textContent = countdown;
+
+    if (countdown <= 0) {
+        clearInterval(timer);
+        continueButton.disabled = false;
+        continueButton.classList.add('active'); // Change button style to active
+        continueButton.style.cursor = 'pointer';
+        countdownElement.textContent = "0"; // Ensure it doesn't go negative
+        document.getElementById('timer').style.display = 'none'; // Hide timer after it reaches 0
+    }
+}, 1000);
@@ -0,0 +1,7 @@
+// Prevent the user from navigating back
+(function() {
+    window.history.pushState(null, null, window.location.href);
+    window.onpopstate = function() {
+        window.history.go(1);
+    };
+})();
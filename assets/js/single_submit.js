@@ -0,0 +1,10 @@
+// Disable a form's submit button once it is clicked, so a contribution is sent only once
+document.addEventListener("DOMContentLoaded", function() {
+    const forms = document.querySelectorAll("form");
+    forms.forEach(form => {
+        form.addEventListener("submit", function(event) {
+            const submitButton = form.querySelector("button[type='submit']");
+            submitButton.disabled = true;
+        });
+    });
+});
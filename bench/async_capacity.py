@@ -0,0 +1,160 @@
+# Capacity of one worker process for waiting participants, DECISION_MODE=thread vs async.
+# N participants reach the waiting page at the same moment while OpenAI is slow; the report
+# shows how long until every bot decision is in, how many OpenAI requests were in flight at
+# once, and the threads and memory the process needed for it.
+#
+#   python bench/async_capacity.py --participants 200 --latency 5
+#   python bench/async_capacity.py --modes async --participants 1000 --latency 5 --json capacity.json
+#
+# Each mode runs in its own process, since DECISION_MODE is read at import, against a fake
+# OpenAI server in this process, so its threads do not count against the app. Prefetching is
+# off so every decision starts at /waiting; the database is a fresh SQLite file unless
+# DATABASE_URL is set.
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss_mb():
+    # Resident memory of this process, from /proc where available
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(options):
+    os.environ['DECISION_PREFETCH'] = '0'
+    # Long enough that the fallback strategy never answers for a slow OpenAI
+    os.environ.setdefault('DECISION_BUDGET', str(options.latency * 4 + 30))
+    os.environ.setdefault('OPENAI_READ_TIMEOUT', str(options.latency * 4 + 30))
+    os.environ.setdefault('OPENAI_TOTAL_TIMEOUT', str(options.latency * 4 + 30))
+    os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    if not os.getenv('DATABASE_URL'):
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='pgg-capacity-'), 'bench.db')
+
+    import app as app_module
+    from models import db
+    from game_engine import control_answer_key
+
+    flask_app = app_module.app
+    with flask_app.app_context():
+        db.create_all()
+
+    # Bring every participant up to the point of submitting a contribution
+    answers = {name: values[0] for name, values in control_answer_key().items()}
+    clients = []
+    for number in range(options.participants):
+        client = flask_app.test_client()
+        client.get(f'/?PROLIFIC_PID=capacity{number}&SESSION_ID=capacity{number}')
+        client.get('/check_cookies')
+        client.post('/incom', data={f'incom_{i}': '3' for i in range(1, 7)})
+        client.post('/questions', data=answers)
+        client.get('/start')
+        client.get('/game')
+        client.post('/play/5')
+        clients.append(client)
+
+    baseline_threads = threading.active_count()
+    peak = {'threads': baseline_threads, 'rss_mb': rss_mb()}
+    sampling = threading.Event()
+
+    def sample():
+        while not sampling.is_set():
+            peak['threads'] = max(peak['threads'], threading.active_count())
+            peak['rss_mb'] = max(peak['rss_mb'], rss_mb())
+            time.sleep(0.05)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    started = time.perf_counter()
+    for client in clients:
+        client.get('/waiting')
+    submitted = time.perf_counter() - started
+
+    waiting = set(range(len(clients)))
+    errors = 0
+    while waiting and time.perf_counter() - started < options.timeout:
+        for number in list(waiting):
+            status = clients[number].get('/waiting/status').get_json()['status']
+            if status != 'pending':
+                waiting.discard(number)
+                errors += status != 'ready'
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    sampling.set()
+    sampler.join()
+
+    return {
+        'mode': app_module.decision_mode,
+        'participants': options.participants,
+        'latency': options.latency,
+        'decided': options.participants - len(waiting) - errors,
+        'errors': errors + len(waiting),
+        'submit_seconds': round(submitted, 2),
+        'all_decided_seconds': round(elapsed, 2),
+        'threads_before': baseline_threads,
+        'peak_threads': peak['threads'],
+        'peak_rss_mb': round(peak['rss_mb'], 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Waiting-participant capacity of one worker, thread vs async decisions')
+    parser.add_argument('--participants', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=5.0, help='fake OpenAI response time')
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--timeout', type=float, default=600, help='give up on decisions after this many seconds')
+    parser.add_argument('--modes', default='thread,async', help='comma-separated DECISION_MODE values to compare')
+    parser.add_argument('--mode', default=None, help=argparse.SUPPRESS)  # Set for the per-mode child process
+    parser.add_argument('--json', dest='json_path', default=None, help='also write the report as JSON')
+    options = parser.parse_args()
+
+    if options.mode:
+        os.environ['DECISION_MODE'] = options.mode
+        print(json.dumps(run_mode(options)))
+        return
+
+    from fake_openai import start_fake_openai
+
+    reports = []
+    for mode in options.modes.split(','):
+        fake_server = start_fake_openai(latency=options.latency, jitter=options.jitter)
+        os.environ['OPENAI_BASE_URL'] = fake_server.base_url
+        command = [sys.executable, os.path.abspath(__file__), '--mode', mode, '--participants', str(options.participants),
+                   '--latency', str(options.latency), '--jitter', str(options.jitter), '--timeout', str(options.timeout)]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        report['peak_openai_in_flight'] = fake_server.peak_in_flight
+        reports.append(report)
+        fake_server.shutdown()
+
+    print(f"{options.participants} participants waiting at once, OpenAI answering in {options.latency}s")
+    print(f"{'mode':<8}{'decided':>9}{'errors':>8}{'all in s':>10}{'in flight':>11}{'threads':>9}{'RSS MB':>9}")
+    for report in reports:
+        print(f"{report['mode']:<8}{report['decided']:>9}{report['errors']:>8}{report['all_decided_seconds']:>10}"
+              f"{report['peak_openai_in_flight']:>11}{report['peak_threads']:>9}{report['peak_rss_mb']:>9}")
+
+    if options.json_path:
+        with open(options.json_path, 'w') as json_file:
+            json.dump(reports, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
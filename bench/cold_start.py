@@ -0,0 +1,146 @@
+# Cold-start timing: how long a fresh process takes to import the app, and how long gunicorn
+# takes from launch until every worker has warmed up (worker_ready event) and the first
+# request is answered, with and without --preload. Also reports each worker's memory; PSS
+# counts pages shared copy-on-write with the master only in part, so it shows what preloading saves.
+#
+#   python bench/cold_start.py
+#   python bench/cold_start.py --workers 4 --runs 5 --json cold_start.json
+#
+# Runs against bench/fake_openai.py and a scratch SQLite file unless DATABASE_URL is set.
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+import urllib.request
+
+repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai import start_fake_openai
+
+
+def import_seconds(env):
+    # Import time of the app in a fresh interpreter
+    code = 'import time; started = time.perf_counter(); import app; print(time.perf_counter() - started)'
+    output = subprocess.run([sys.executable, '-c', code], cwd=repo, env=env, check=True, capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def memory_kb(pid):
+    # (RSS, PSS) in kB from /proc, or (None, None) where that is not available
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as smaps:
+            values = {line.split(':')[0]: int(line.split()[1]) for line in smaps if line.split(':')[0] in ('Rss', 'Pss')}
+        return values.get('Rss'), values.get('Pss')
+    except OSError:
+        return None, None
+
+
+def children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as listing:
+            return [int(child) for child in listing.read().split()]
+    except OSError:
+        return []
+
+
+def boot(env, workers, preload, timeout):
+    # Starts gunicorn and times it until all workers are warm and a request succeeds
+    port = free_port()
+    command = ['gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', 'app:app']
+    if preload:
+        command.append('--preload')
+
+    ready = []
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=repo, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+    def read_output():
+        for line in server.stdout:
+            if '"event": "worker_ready"' in line:
+                ready.append((time.perf_counter() - started, json.loads(line)))
+
+    threading.Thread(target=read_output, daemon=True).start()
+
+    try:
+        first_response = None
+        while time.perf_counter() - started < timeout:
+            if first_response is None:
+                try:
+                    urllib.request.urlopen(f'http://127.0.0.1:{port}/cookies_required', timeout=1).read()
+                    first_response = time.perf_counter() - started
+                except OSError:  # Refused, reset or timed out while the workers boot
+                    pass
+            if first_response is not None and len(ready) >= workers:
+                break
+            time.sleep(0.02)
+
+        memory = [memory_kb(pid) for pid in children(server.pid)]
+        return {
+            'preload': preload,
+            'first_response_seconds': round(first_response, 3) if first_response is not None else None,
+            'all_workers_ready_seconds': round(max(seconds for seconds, _ in ready), 3) if len(ready) >= workers else None,
+            'warm_up_ms': [event['latency_ms'] for _, event in ready],
+            'worker_rss_mb': [round(rss / 1024, 1) for rss, _ in memory if rss],
+            'worker_pss_mb': [round(pss / 1024, 1) for _, pss in memory if pss]
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold-start timing for the app and for gunicorn workers')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--runs', type=int, default=3, help='repetitions of each measurement; medians are reported')
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--json', dest='json_path', default=None, help='also write the report as JSON')
+    options = parser.parse_args()
+
+    fake_server = start_fake_openai(latency=0.05, jitter=0.0)
+    env = dict(os.environ)
+    env['OPENAI_BASE_URL'] = fake_server.base_url
+    env.setdefault('OPENAI_API_KEY', 'sk-bench')
+    env.setdefault('SECRET_KEY', 'bench')
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='pgg-cold-'), 'bench.db'))
+    env.pop('GUNICORN_PRELOAD', None)
+
+    imports = [import_seconds(env) for _ in range(options.runs)]
+    report = {'workers': options.workers, 'import_seconds': round(statistics.median(imports), 3), 'boots': []}
+    print(f"Import of app: {report['import_seconds']}s (median of {options.runs})")
+
+    print(f"{'preload':<9}{'first response s':>18}{'all ready s':>13}{'warm-up ms':>12}{'RSS MB/worker':>15}{'PSS MB/worker':>15}")
+    for preload in (False, True):
+        runs = [boot(env, options.workers, preload, options.timeout) for _ in range(options.runs)]
+        report['boots'].extend(runs)
+
+        def median(key):
+            values = [run[key] for run in runs if run[key] is not None]
+            return round(statistics.median(values), 3) if values else None
+
+        def median_of_lists(key):
+            values = [value for run in runs for value in run[key]]
+            return round(statistics.median(values), 1) if values else None
+
+        print(f"{'on' if preload else 'off':<9}{median('first_response_seconds')!s:>18}{median('all_workers_ready_seconds')!s:>13}"
+              f"{median_of_lists('warm_up_ms')!s:>12}{median_of_lists('worker_rss_mb')!s:>15}{median_of_lists('worker_pss_mb')!s:>15}")
+
+    if options.json_path:
+        with open(options.json_path, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
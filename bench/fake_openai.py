@@ -0,0 +1,163 @@
+# Local stand-in for the OpenAI chat completions API, for load tests and benchmarks.
+# Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1
+#
+#   python bench/fake_openai.py --port 8765 --latency 0.4 --tail-latency 6 --tail-rate 0.05
+#   python bench/fake_openai.py --rpm 60 --tpm 30000   # answer 429 above these per-minute limits
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so connection reuse shows up in measurements
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.server.count_request()
+        try:
+            self._answer()
+        finally:
+            self.server.request_finished()
+
+    def _answer(self):
+        options = self.server.options
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+
+        prompt_tokens = sum(len(m.get('content', '')) for m in request.get('messages', [])) // 4
+        retry_after = self.server.check_rate_limit(prompt_tokens + request.get('max_tokens', 16))
+        if retry_after is not None:
+            self._send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'requests', 'code': 'rate_limit_exceeded'}},
+                            headers={'retry-after': f'{retry_after:.3f}'})
+            return
+
+        # Typical latency with jitter, plus an occasional slow tail
+        delay = max(0.0, random.gauss(options.latency, options.jitter))
+        if random.random() < options.tail_rate:
+            delay = options.tail_latency
+        time.sleep(delay)
+
+        if random.random() < options.error_rate:
+            self._send_json(500, {'error': {'message': 'Injected server error', 'type': 'server_error'}})
+            return
+
+        content = options.reply if options.reply is not None else str(random.randint(0, 10))
+        self._send_json(200, {
+            'id': f'chatcmpl-fake{random.getrandbits(48):x}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'gpt-4o'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'logprobs': None,
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': 1, 'total_tokens': prompt_tokens + 1}
+        })
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, options):
+        super().__init__(address, FakeOpenAIHandler)
+        self.options = options
+        self.requests_served = 0
+        self.requests_limited = 0
+        self.requests_in_flight = 0
+        self.peak_in_flight = 0  # Most requests being answered at once
+        self._count_lock = threading.Lock()
+        self._requests_left = options.rpm
+        self._tokens_left = options.tpm
+        self._refilled_at = time.monotonic()
+
+    def count_request(self):
+        with self._count_lock:
+            self.requests_served += 1
+            self.requests_in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.requests_in_flight)
+
+    def request_finished(self):
+        with self._count_lock:
+            self.requests_in_flight -= 1
+
+    def check_rate_limit(self, tokens):
+        # Token buckets refilled continuously, like OpenAI's limits; returns None if the
+        # request fits, else seconds until it would
+        rpm, tpm = self.options.rpm, self.options.tpm
+        if not rpm and not tpm:
+            return None
+        with self._count_lock:
+            now = time.monotonic()
+            elapsed = now - self._refilled_at
+            self._refilled_at = now
+            if rpm:
+                self._requests_left = min(rpm, self._requests_left + elapsed * rpm / 60)
+            if tpm:
+                self._tokens_left = min(tpm, self._tokens_left + elapsed * tpm / 60)
+
+            waits = []
+            if rpm and self._requests_left < 1:
+                waits.append((1 - self._requests_left) * 60 / rpm)
+            if tpm and self._tokens_left < tokens:
+                waits.append((tokens - self._tokens_left) * 60 / tpm)
+            if waits:
+                self.requests_limited += 1
+                return max(waits)
+
+            self._requests_left -= 1
+            self._tokens_left -= tokens
+            return None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Fake OpenAI chat completions endpoint')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.4, help='typical response time in seconds')
+    parser.add_argument('--jitter', type=float, default=0.1, help='standard deviation of the response time')
+    parser.add_argument('--tail-latency', type=float, default=5.0, help='response time of slow requests')
+    parser.add_argument('--tail-rate', type=float, default=0.0, help='fraction of requests that are slow')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with HTTP 500')
+    parser.add_argument('--reply', default=None, help='fixed reply text instead of a random 0-10')
+    parser.add_argument('--rpm', type=int, default=0, help='requests per minute before answering 429 (0 = unlimited)')
+    parser.add_argument('--tpm', type=int, default=0, help='tokens per minute before answering 429 (0 = unlimited)')
+    return parser
+
+
+def start_fake_openai(**overrides):
+    # Start a server on a background thread, e.g. start_fake_openai(port=0, latency=0.2)
+    options = build_parser().parse_args([])
+    options.port = 0
+    for name, value in overrides.items():
+        setattr(options, name, value)
+    server = FakeOpenAIServer((options.host, options.port), options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    options = build_parser().parse_args()
+    server = FakeOpenAIServer((options.host, options.port), options)
+    print(f'Fake OpenAI listening on {server.base_url}')
+    server.serve_forever()
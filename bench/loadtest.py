@@ -0,0 +1,256 @@
+# Load test for the full participant flow: welcome, questionnaire, 2 sessions x 10 games, result.
+# Every simulated participant walks the real route sequence; the report lists p50/p95/p99
+# latency and database statements per route, plus throughput.
+#
+#   python bench/loadtest.py --participants 50 --concurrency 10 --latency 0.4
+#   DATABASE_URL=postgresql://localhost/pgg_bench python bench/loadtest.py --participants 200 --concurrency 40
+#   python bench/loadtest.py --url http://127.0.0.1:8000 --server-workers 4   # a running gunicorn
+#
+# In-process runs (the default) start bench/fake_openai.py on a background thread, point the
+# app at it and use a fresh SQLite file unless DATABASE_URL is set. Against --url, start the
+# server with OPENAI_BASE_URL pointing at a fake_openai.py process; statement counts are only
+# available in-process.
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai import start_fake_openai
+
+
+class Recorder:
+    # Latencies and statement counts per route, shared by all participant threads
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statements = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+        self.current = threading.local()
+
+    def record(self, route, seconds, statements, ok):
+        with self.lock:
+            self.latencies[route].append(seconds)
+            self.statements[route] += statements
+            if not ok:
+                self.errors[route] += 1
+
+    def count_statement(self):
+        # Statements issued outside a recorded request (e.g. by decision threads) go to 'background'
+        route = getattr(self.current, 'route', None) or 'background'
+        if route == 'background':
+            with self.lock:
+                self.statements[route] += 1
+        else:
+            self.current.statements += 1
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class InProcessClient:
+    # Drives the app through Flask's test client, one cookie jar per participant
+    def __init__(self, flask_app, recorder):
+        self.client = flask_app.test_client()
+        self.recorder = recorder
+
+    def request(self, route, method, url, data=None):
+        current = self.recorder.current
+        current.route, current.statements = route, 0
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self.client.open(url, method=method, data=data)
+            ok = response.status_code < 400
+            return response.status_code, response.headers.get('Location'), response.get_json(silent=True) if response.is_json else None
+        finally:
+            self.recorder.record(route, time.perf_counter() - started, current.statements, ok)
+            current.route = None
+
+
+class HTTPClient:
+    # Drives a running server over HTTP with its own cookie jar per participant
+    def __init__(self, base_url, recorder):
+        import requests
+
+        self.session = requests.Session()
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+
+    def request(self, route, method, url, data=None):
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.request(method, self.base_url + url, data=data, allow_redirects=False, timeout=120)
+            ok = response.status_code < 400
+            is_json = response.headers.get('Content-Type', '').startswith('application/json')
+            return response.status_code, response.headers.get('Location'), response.json() if is_json else None
+        finally:
+            self.recorder.record(route, time.perf_counter() - started, 0, ok)
+
+
+def relative(location):
+    # Redirect targets may be absolute; keep the path and query
+    if location and '://' in location:
+        location = '/' + location.split('://', 1)[1].split('/', 1)[1]
+    return location
+
+
+def run_participant(client, number, answers, think_time, games, poll_interval):
+    def think():
+        if think_time:
+            time.sleep(random.uniform(0.5, 1.5) * think_time)
+
+    client.request('/', 'GET', f'/?PROLIFIC_PID=bench{number}&SESSION_ID=bench{number}')
+    client.request('/check_cookies', 'GET', '/check_cookies')
+    client.request('/show_welcome', 'GET', '/show_welcome')
+    client.request('/instructions', 'GET', '/instructions')
+    think()
+    client.request('/incom', 'POST', '/incom', data={f'incom_{i}': str(random.randint(1, 5)) for i in range(1, 7)})
+    think()
+    client.request('/questions', 'POST', '/questions', data={name: values[0] for name, values in answers.items()})
+    client.request('/start', 'GET', '/start')
+
+    for session_num in (1, 2):
+        for game in range(1, games + 1):
+            client.request('/game', 'GET', '/game')
+            think()
+            client.request('/play', 'POST', f'/play/{random.randint(0, 10)}')
+            client.request('/waiting', 'GET', '/waiting')
+
+            # Poll like the waiting page does until the bot has decided
+            deadline = time.monotonic() + 120
+            while time.monotonic() < deadline:
+                _, _, payload = client.request('/waiting/status', 'GET', '/waiting/status')
+                status = (payload or {}).get('status')
+                if status in ('ready', 'error'):
+                    break
+                if status == 'retry':
+                    client.request('/waiting', 'GET', '/waiting')
+                time.sleep(poll_interval)
+
+            client.request('/outcome', 'GET', '/outcome')
+            think()
+            _, location, _ = client.request('/continue_after_outcome', 'GET', '/continue_after_outcome')
+            location = relative(location)
+            if location and not location.startswith('/game'):
+                # Session break (/message or /average_message) or the final /result
+                route = location.split('?')[0]
+                client.request(route, 'GET', location)
+
+    if not location or not location.startswith('/result'):
+        client.request('/result', 'GET', '/result')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test for the full participant flow')
+    parser.add_argument('--participants', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=10, help='participants in flight at once')
+    parser.add_argument('--games', type=int, default=10, help='games per session (must match the app)')
+    parser.add_argument('--think-time', type=float, default=0.0, help='mean seconds a participant pauses between pages')
+    parser.add_argument('--poll-interval', type=float, default=0.1, help='seconds between /waiting/status polls')
+    parser.add_argument('--url', default=None, help='drive a running server instead of an in-process app')
+    parser.add_argument('--server-workers', type=int, default=1, help='worker processes behind --url, for per-worker throughput')
+    parser.add_argument('--latency', type=float, default=0.3, help='fake OpenAI response time (in-process runs)')
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--tail-latency', type=float, default=5.0)
+    parser.add_argument('--tail-rate', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--json', dest='json_path', default=None, help='also write the report as JSON')
+    options = parser.parse_args()
+
+    recorder = Recorder()
+    workers = options.server_workers
+
+    if options.url:
+        make_client = lambda: HTTPClient(options.url, recorder)
+        backend = options.url
+    else:
+        fake_server = start_fake_openai(latency=options.latency, jitter=options.jitter, tail_latency=options.tail_latency,
+                                        tail_rate=options.tail_rate, error_rate=options.error_rate)
+        os.environ['OPENAI_BASE_URL'] = fake_server.base_url
+        os.environ.setdefault('OPENAI_API_KEY', 'sk-bench')
+        os.environ.setdefault('SECRET_KEY', 'bench')
+        if not os.getenv('DATABASE_URL'):
+            os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='pgg-bench-'), 'bench.db')
+
+        import app as app_module
+        from models import db
+        from sqlalchemy import event
+
+        flask_app = app_module.app
+        with flask_app.app_context():
+            db.create_all()
+            event.listen(db.engine, 'before_cursor_execute', lambda *args: recorder.count_statement())
+
+        make_client = lambda: InProcessClient(flask_app, recorder)
+        backend = os.environ['DATABASE_URL'].split('://', 1)[0] + ' (in-process)'
+        workers = 1
+
+    from game_engine import control_answer_key
+    answers = control_answer_key()
+
+    def participant(number):
+        try:
+            run_participant(make_client(), number, answers, options.think_time, options.games, options.poll_interval)
+            return True
+        except Exception as e:
+            print(f'Participant {number} failed: {e!r}')
+            return False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.concurrency) as pool:
+        finished = sum(pool.map(participant, range(options.participants)))
+    elapsed = time.perf_counter() - started
+
+    total_requests = sum(len(values) for values in recorder.latencies.values())
+    report = {
+        'backend': backend,
+        'participants': options.participants,
+        'finished': finished,
+        'concurrency': options.concurrency,
+        'seconds': round(elapsed, 2),
+        'requests': total_requests,
+        'requests_per_second': round(total_requests / elapsed, 1),
+        'requests_per_second_per_worker': round(total_requests / elapsed / workers, 1),
+        'participants_per_minute': round(finished / elapsed * 60, 1),
+        'background_statements': recorder.statements.get('background', 0),
+        'routes': {}
+    }
+    for route, values in recorder.latencies.items():
+        report['routes'][route] = {
+            'count': len(values),
+            'errors': recorder.errors.get(route, 0),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 1),
+            # Not measurable from outside the server process
+            'statements_per_request': None if options.url else round(recorder.statements.get(route, 0) / len(values), 2)
+        }
+
+    print(f"{report['backend']}: {finished}/{options.participants} participants in {elapsed:.1f}s, "
+          f"{report['requests_per_second']} req/s ({report['requests_per_second_per_worker']} per worker), "
+          f"{report['participants_per_minute']} participants/min")
+    print(f"{'route':<26}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'stmts/req':>11}")
+    for route, row in sorted(report['routes'].items(), key=lambda item: -item[1]['count']):
+        print(f"{route:<26}{row['count']:>7}{row['errors']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{'-' if row['statements_per_request'] is None else row['statements_per_request']:>11}")
+    if not options.url:
+        print(f"Statements outside requests (decision threads): {report['background_statements']}")
+
+    if options.json_path:
+        with open(options.json_path, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+import copy
+import threading
+import datetime
+from collections import OrderedDict
+from sqlalchemy.exc import IntegrityError
+from models import db, ConversationState
+
+
+# Per-process cache of decoded conversations, keyed by participant_id. Entries are
+# tagged with the version the participant's cookie carries, so a worker only trusts
+# its copy when no other worker has written a newer one in the meantime.
+cache_size = int(os.getenv('CONVERSATION_CACHE_SIZE', 1024))
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def empty_conversation():
+    return {'game_history': []}
+
+
+def _remember(participant_id, version, conversation):
+    with _cache_lock:
+        _cache[participant_id] = (version, copy.deepcopy(conversation))
+        _cache.move_to_end(participant_id)
+        while len(_cache) > cache_size:
+            _cache.popitem(last=False)
+
+
+def load_conversation(participant_id, version=None):
+    # Serve from the cache when it holds the version the caller expects
+    if version is not None:
+        with _cache_lock:
+            cached = _cache.get(participant_id)
+            if cached is not None and cached[0] == version:
+                _cache.move_to_end(participant_id)
+                return copy.deepcopy(cached[1])
+
+    state = db.session.get(ConversationState, participant_id)
+    if state is None:
+        return empty_conversation()
+
+    conversation = {'game_history': state.game_history or []}
+    _remember(participant_id, state.version, conversation)
+    return copy.deepcopy(conversation)
+
+
+def save_conversation(participant_id, conversation):
+    # Write through to the database and return the new version for the cookie
+    now = datetime.datetime.now(datetime.UTC)
+    for attempt in range(2):
+        try:
+            state = db.session.get(ConversationState, participant_id)
+            if state is None:
+                state = ConversationState(participant_id=participant_id, version=0)
+                db.session.add(state)
+            state.game_history = conversation['game_history']
+            state.version += 1
+            state.updated_at = now
+            db.session.commit()
+            break
+        except IntegrityError:
+            # Another worker created the row first; retry as an update
+            db.session.rollback()
+            if attempt:
+                raise
+
+    _remember(participant_id, state.version, conversation)
+    return state.version
@@ -0,0 +1,113 @@
+import os
+import json
+import random
+import hashlib
+import datetime
+import threading
+from models import db, DecisionCacheEntry
+from event_log import log_error
+
+
+# 'off' disables the cache, 'replay' reuses the first answer stored for a state and
+# 'sample' collects several answers per state and then draws from them at random
+cache_policy = os.getenv('DECISION_CACHE', 'off')
+cache_ttl = int(os.getenv('DECISION_CACHE_TTL', 24 * 3600))  # Seconds an answer stays usable
+cache_max_entries = int(os.getenv('DECISION_CACHE_MAX_ENTRIES', 10000))
+cache_samples = int(os.getenv('DECISION_CACHE_SAMPLES', 5))  # Answers collected per state in 'sample' mode
+evict_every = int(os.getenv('DECISION_CACHE_EVICT_EVERY', 50))  # Inserts between eviction sweeps
+
+_inserts = 0
+_inserts_lock = threading.Lock()
+
+
+def cache_enabled():
+    return cache_policy in ('replay', 'sample')
+
+
+def decision_cache_key(model, messages, session_num, group):
+    # The prompt already carries the system instructions and the canonical round history
+    payload = json.dumps({
+        'model': model,
+        'session_num': session_num,
+        'group': group,
+        'messages': messages
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _now():
+    return datetime.datetime.now(datetime.UTC)
+
+
+def lookup_decision(cache_key):
+    # Returns a cached bot contribution for this state, or None on a miss
+    if not cache_enabled():
+        return None
+
+    cutoff = _now() - datetime.timedelta(seconds=cache_ttl)
+    entries = DecisionCacheEntry.query.filter(
+        DecisionCacheEntry.cache_key == cache_key,
+        DecisionCacheEntry.created_at >= cutoff
+    ).order_by(DecisionCacheEntry.created_at).limit(max(cache_samples, 1)).all()
+
+    if not entries:
+        return None
+    if cache_policy == 'replay':
+        entry = entries[0]
+    elif len(entries) >= cache_samples:
+        entry = random.choice(entries)
+    else:
+        # Still building up the distribution for this state
+        return None
+
+    try:
+        entry.last_used_at = _now()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log_error('db_error', f"Unexpected error: {e}", operation='lookup_decision')
+    return entry.bot_contribution
+
+
+def store_decision(cache_key, bot_contribution):
+    if not cache_enabled():
+        return
+
+    now = _now()
+    try:
+        db.session.add(DecisionCacheEntry(
+            cache_key=cache_key,
+            bot_contribution=bot_contribution,
+            created_at=now,
+            last_used_at=now
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log_error('db_error', f"Unexpected error: {e}", operation='store_decision')
+        return
+
+    global _inserts
+    with _inserts_lock:
+        _inserts += 1
+        sweep = _inserts % evict_every == 0
+    if sweep:
+        evict_decisions()
+
+
+def evict_decisions():
+    # Drop expired answers, then the least recently used ones beyond the size limit
+    try:
+        cutoff = _now() - datetime.timedelta(seconds=cache_ttl)
+        DecisionCacheEntry.query.filter(DecisionCacheEntry.created_at < cutoff).delete(synchronize_session=False)
+
+        excess = DecisionCacheEntry.query.count() - cache_max_entries
+        if excess > 0:
+            stale_ids = db.session.query(DecisionCacheEntry.id).order_by(
+                DecisionCacheEntry.last_used_at
+            ).limit(excess).subquery()
+            DecisionCacheEntry.query.filter(DecisionCacheEntry.id.in_(db.select(stale_ids))).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log_error('db_error', f"Unexpected error: {e}", operation='evict_decisions')
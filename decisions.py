@@ -0,0 +1,151 @@
+import os
+import time
+import socket
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Bounded pool for bot decisions so a burst of waiting participants queues up
+# here instead of tying up one gunicorn worker per OpenAI round-trip
+max_decision_workers = int(os.getenv('DECISION_WORKERS', 8))
+executor = ThreadPoolExecutor(max_workers=max_decision_workers, thread_name_prefix='decision')
+
+# Speculative decisions for the next round get their own pool, so a /waiting job
+# blocked on a prefetch can never starve the prefetch it is waiting for
+prefetch_enabled = os.getenv('DECISION_PREFETCH', '1') == '1'
+max_prefetch_workers = int(os.getenv('PREFETCH_WORKERS', max_decision_workers))
+prefetch_executor = ThreadPoolExecutor(max_workers=max_prefetch_workers, thread_name_prefix='prefetch')
+
+# DECISION_MODE=async runs coroutine jobs on one event loop per process instead of the pools
+# above: a decision waiting on OpenAI then holds a socket rather than a thread, so a worker
+# can keep hundreds in flight. The limits cap how many of each kind run at once.
+decision_mode = os.getenv('DECISION_MODE', 'thread')
+max_async_decisions = int(os.getenv('ASYNC_DECISION_LIMIT', 200))
+max_async_prefetches = int(os.getenv('ASYNC_PREFETCH_LIMIT', max_async_decisions))
+
+
+# In-flight decisions of this process, keyed by (participant_id, session_num, round_num)
+_pending = {}
+_prefetched = {}
+_pending_lock = threading.Lock()
+
+# A finished decision stays here this long for status polls that reach this process, then is
+# dropped: its result is in the database by then, which is where other workers look anyway.
+# Without this, rounds whose participant is served by another worker would never be removed.
+decision_retention = float(os.getenv('DECISION_RETENTION', 120))
+_finished_at = {}
+
+_loop = None
+_loop_lock = threading.Lock()
+_slots = {}
+
+
+def event_loop():
+    # Started on first use rather than at import, so it runs in the forked worker
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            # Blocking work of async jobs (database calls) runs here, bounded like the pools above
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=max_decision_workers, thread_name_prefix='decision-io'))
+            threading.Thread(target=loop.run_forever, name='decision-loop', daemon=True).start()
+            _loop = loop
+    return _loop
+
+
+async def _limited(kind, coroutine):
+    # Semaphores belong to the loop, so they are created on it
+    if kind not in _slots:
+        _slots[kind] = asyncio.Semaphore(max_async_decisions if kind == 'decide' else max_async_prefetches)
+    async with _slots[kind]:
+        return await coroutine
+
+
+def _start(kind, pool, fn, args, kwargs):
+    # Coroutine functions go to the event loop, anything else to the thread pool; both
+    # return a concurrent.futures.Future, so callers do not care which
+    if asyncio.iscoroutinefunction(fn):
+        # Scheduled from an empty context: the task would otherwise inherit the submitting
+        # request's context variables, Flask's request context among them, and outlive it
+        coroutine = _limited(kind, fn(*args, **kwargs))
+        return contextvars.Context().run(asyncio.run_coroutine_threadsafe, coroutine, event_loop())
+    return pool.submit(fn, *args, **kwargs)
+
+
+def _sweep():
+    # Drops finished futures older than decision_retention; called with _pending_lock held
+    now = time.monotonic()
+    for futures in (_pending, _prefetched):
+        for key, future in list(futures.items()):
+            if not future.done():
+                continue
+            if now - _finished_at.setdefault(future, now) >= decision_retention:
+                del futures[key]
+                del _finished_at[future]
+
+
+def decision_key(participant_id, session_num, round_num):
+    return (participant_id, int(session_num), int(round_num))
+
+
+def submit_decision(key, fn, *args, **kwargs):
+    # Reuse the decision already running for this round instead of starting another one
+    with _pending_lock:
+        _sweep()
+        future = _pending.get(key)
+        if future is None:
+            future = _start('decide', executor, fn, args, kwargs)
+            _pending[key] = future
+    return future
+
+
+def decision_status(key):
+    # Returns 'pending', 'ready', 'error', or None if this process knows nothing about the key
+    with _pending_lock:
+        future = _pending.get(key)
+
+    if future is None:
+        return None
+    if not future.done():
+        return 'pending'
+    if future.exception() is not None:
+        return 'error'
+    return 'ready'
+
+
+def pop_decision(key):
+    # Forget a finished decision once the round has been shown to the participant
+    with _pending_lock:
+        future = _pending.get(key)
+        if future is not None and future.done():
+            del _pending[key]
+            _finished_at.pop(future, None)
+        else:
+            future = None
+    return future
+
+
+def submit_prefetch(key, fn, *args, **kwargs):
+    # Start the bot's move for an upcoming round while the participant is still choosing
+    with _pending_lock:
+        _sweep()
+        future = _prefetched.get(key)
+        if future is None:
+            future = _start('prefetch', prefetch_executor, fn, args, kwargs)
+            _prefetched[key] = future
+    return future
+
+
+def take_prefetch(key):
+    # Hand over this process's prefetch for the round, if it started one
+    with _pending_lock:
+        future = _prefetched.pop(key, None)
+        _finished_at.pop(future, None)
+    return future
+
+
+def worker_id():
+    # Identifies this process when it claims a participant round across workers
+    return f"{socket.gethostname()}:{os.getpid()}"
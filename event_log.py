@@ -0,0 +1,155 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import datetime
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, request, session, has_request_context
+
+
+# Structured event log. log_event() puts a record on an in-memory queue and returns; a listener
+# thread writes it to stdout as one JSON line. When the queue is full the record is dropped
+# rather than blocking the caller, and the number dropped is logged once there is room again.
+queue_size = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# Fraction of each event type to keep, e.g. LOG_SAMPLE="request=0.1,contribution=0.5";
+# event types not listed are always kept
+sample_rates = {
+    name.strip(): float(rate)
+    for name, _, rate in (item.partition('=') for item in os.getenv('LOG_SAMPLE', '').split(',') if item.strip())
+}
+
+logger = logging.getLogger('pgg')
+logger.setLevel(log_level)
+logger.propagate = False
+
+_handler = None
+_started_pid = None
+_start_lock = threading.Lock()
+
+
+class DroppingQueueHandler(QueueHandler):
+    def __init__(self, records):
+        super().__init__(records)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def prepare(self, record):
+        # Resolve the message and traceback now, while they are still valid; the structured
+        # fields travel as they are and are serialized on the listener thread
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+class DrainingQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # At shutdown, wait for room rather than give up on stopping with a full queue
+        self.queue.put(self._sentinel)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'event': getattr(record, 'event', record.name)
+        }
+        if record.getMessage():
+            payload['message'] = record.getMessage()
+        payload.update(getattr(record, 'fields', {}))
+        if record.exc_text:
+            payload['traceback'] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class JsonLinesHandler(logging.StreamHandler):
+    # Runs on the listener thread; also reports records the queue handler had to drop
+    def __init__(self, queue_handler):
+        super().__init__(sys.stdout)
+        self.setFormatter(JsonFormatter())
+        self.queue_handler = queue_handler
+        self.reported = 0
+
+    def emit(self, record):
+        super().emit(record)
+        dropped = self.queue_handler.dropped
+        if dropped > self.reported:
+            super().emit(logging.makeLogRecord({
+                'name': logger.name, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': 'Log queue was full', 'event': 'log_dropped', 'fields': {'dropped': dropped - self.reported}
+            }))
+            self.reported = dropped
+
+
+def _start():
+    # One queue and listener thread per process, started on first use so that a forked worker
+    # gets its own rather than a copy of the parent's, whose thread did not survive the fork
+    global _handler, _started_pid
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        if _handler is not None:
+            logger.removeHandler(_handler)
+
+        handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        listener = DrainingQueueListener(handler.queue, JsonLinesHandler(handler))
+        listener.start()
+        atexit.register(listener.stop)  # Writes out whatever is still queued
+        logger.addHandler(handler)
+        _handler, _started_pid = handler, os.getpid()
+
+
+def log_event(event, message=None, level=logging.INFO, **fields):
+    # Logs one event with its fields (participant_id, session_num, round_num, source, latency_ms,
+    # ...). Inside a request, the route and the participant's current round are added unless given.
+    if not logger.isEnabledFor(level):
+        return
+    rate = sample_rates.get(event)
+    if rate is not None and random.random() >= rate:
+        return
+    if _started_pid != os.getpid():
+        _start()
+
+    if has_request_context():
+        fields.setdefault('route', request.endpoint)
+        for field, key in (('participant_id', 'participant_id'), ('session_num', 'session_num'), ('round_num', 'game')):
+            if key in session:
+                fields.setdefault(field, session[key])
+    logger.log(level, message or '', extra={'event': event, 'fields': fields})
+
+
+def log_error(event, message, **fields):
+    log_event(event, message, logging.ERROR, **fields)
+
+
+def _before_request():
+    g.log_started = time.perf_counter()
+
+
+def _after_request(response):
+    if 'log_started' in g:
+        log_event('request', method=request.method, status=response.status_code,
+                  latency_ms=round((time.perf_counter() - g.log_started) * 1000, 1))
+    return response
+
+
+def init_app(app):
+    # One 'request' event per response, with its route and latency
+    app.before_request(_before_request)
+    app.after_request(_after_request)
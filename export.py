@@ -0,0 +1,150 @@
+import io
+import os
+import csv
+import time
+from sqlalchemy import select, func, cast, Float, Integer, DateTime
+from models import db, Participant, Questionnaire
+
+
+
+# Rows are read through a server-side cursor chunk_size at a time, so memory stays flat
+# however large the table is; the optional pause between chunks keeps a long export from
+# saturating the database while a study is running
+chunk_size = int(os.getenv('EXPORT_CHUNK_SIZE', 5000))
+chunk_pause = float(os.getenv('EXPORT_CHUNK_PAUSE', 0))
+
+round_columns = [
+    Participant.participant_id, Participant.prolific_pid, Participant.session_id, Participant.group,
+    Participant.session_num, Participant.round_num, Participant.contribution, Participant.bot_contribution,
+    Participant.participant_balance, Participant.bot_balance, Participant.net_gain,
+    Participant.start_timestamp, Participant.end_timestamp, Participant.bonus, Participant.decision_source,
+    Questionnaire.incom_1, Questionnaire.incom_2, Questionnaire.incom_3,
+    Questionnaire.incom_4, Questionnaire.incom_5, Questionnaire.incom_6
+]
+
+session_columns = [
+    Participant.participant_id.label('participant_id'),
+    func.min(Participant.prolific_pid).label('prolific_pid'),
+    func.min(Participant.group).label('group'),
+    Participant.session_num.label('session_num'),
+    func.count().label('rounds'),
+    cast(func.avg(Participant.contribution), Float).label('human_avg_contribution'),
+    cast(func.avg(Participant.bot_contribution), Float).label('ai_avg_contribution'),
+    func.sum(Participant.participant_balance).label('total_participant_balance'),
+    func.sum(Participant.bot_balance).label('total_bot_balance'),
+    func.max(Participant.bonus).label('bonus'),
+    func.min(Participant.start_timestamp).label('start_timestamp'),
+    func.max(Participant.end_timestamp).label('end_timestamp')
+]
+
+
+def apply_filters(statement, start=None, end=None, group=None, completed=None):
+    # start/end bound the participant's start_timestamp; completed selects participants who
+    # did (True) or did not (False) reach the result page
+    if start is not None:
+        statement = statement.where(Participant.start_timestamp >= start)
+    if end is not None:
+        statement = statement.where(Participant.start_timestamp < end)
+    if group is not None:
+        statement = statement.where(Participant.group == group)
+    if completed is not None:
+        finished = select(Participant.participant_id).where(Participant.end_timestamp.isnot(None))
+        if completed:
+            statement = statement.where(Participant.participant_id.in_(finished))
+        else:
+            statement = statement.where(Participant.participant_id.not_in(finished))
+    return statement
+
+
+def export_statement(kind='rounds', **filters):
+    # 'rounds' is one row per round with the questionnaire answers, 'sessions' one row per
+    # participant session with its aggregates
+    if kind == 'rounds':
+        statement = select(*round_columns).outerjoin(
+            Questionnaire, Questionnaire.participant_id == Participant.participant_id
+        )
+        statement = apply_filters(statement, **filters)
+        return statement.order_by(Participant.participant_id, Participant.session_num, Participant.round_num)
+    if kind == 'sessions':
+        statement = apply_filters(select(*session_columns), **filters)
+        return statement.group_by(Participant.participant_id, Participant.session_num).order_by(
+            Participant.participant_id, Participant.session_num
+        )
+    raise ValueError(f"Unknown export kind: {kind}")
+
+
+def iter_chunks(statement, engine=None):
+    # Yields (column names, list of row tuples) per chunk from a read-only server-side cursor on
+    # its own connection, so the export never holds the request session or takes write locks
+    with (engine or db.engine).connect() as connection:
+        options = {'stream_results': True, 'yield_per': chunk_size}
+        if connection.dialect.name == 'postgresql':
+            options['postgresql_readonly'] = True
+        result = connection.execution_options(**options).execute(statement)
+        columns = list(result.keys())
+        for partition in result.partitions():
+            yield columns, [tuple(row) for row in partition]
+            if chunk_pause:
+                time.sleep(chunk_pause)
+
+
+def iter_csv(statement):
+    # CSV text in pieces, header first, for writing to a file or streaming a response
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    for columns, rows in iter_chunks(statement):
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if not header_written:
+        # No rows matched; still emit the header
+        yield ','.join(column.name for column in statement.selected_columns) + '\r\n'
+
+
+def write_csv(statement, path):
+    with open(path, 'w', newline='') as csv_file:
+        for text in iter_csv(statement):
+            csv_file.write(text)
+
+
+def import_pyarrow():
+    # Parquet output needs pyarrow, which is in requirements.txt. Imported on demand, since the
+    # web workers only ever stream CSV; returns None in a dev environment without it.
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _arrow_type(pyarrow, column_type):
+    if isinstance(column_type, Integer):
+        return pyarrow.int64()
+    if isinstance(column_type, Float):
+        return pyarrow.float64()
+    if isinstance(column_type, DateTime):
+        return pyarrow.timestamp('us')
+    return pyarrow.string()
+
+
+def write_parquet(statement, path):
+    # One row group per chunk, written as it arrives. The schema comes from the column types,
+    # so a chunk where a column happens to be all NULL still matches the others.
+    pyarrow = import_pyarrow()
+    if pyarrow is None:
+        raise RuntimeError("Parquet export needs pyarrow; install it or export CSV instead")
+
+    schema = pyarrow.schema([(column.name, _arrow_type(pyarrow, column.type)) for column in statement.selected_columns])
+    rows = 0
+    with pyarrow.parquet.ParquetWriter(path, schema) as writer:
+        for columns, chunk in iter_chunks(statement):
+            writer.write_table(pyarrow.Table.from_pylist([dict(zip(columns, row)) for row in chunk], schema=schema))
+            rows += len(chunk)
+    return rows
@@ -0,0 +1,62 @@
+# Rules of the one-shot public goods game. Each player gets initial_tokens and contributes
+# part of them to a group account; if the contributions reach the threshold, the group
+# account is multiplied. Each player keeps the rest of their tokens and gets half the group account.
+initial_tokens = 10
+threshold = 10
+multiplier = 1.5
+
+# Payment: a fixed base plus 1 USD for every tokens_per_usd tokens earned per game on average
+tokens_per_usd = 15
+base_payment_usd = 1.61
+
+
+def payoffs(contribution, bot_contribution, initial_tokens=initial_tokens, threshold=threshold, multiplier=multiplier):
+    # Plain arithmetic, so it works on scalars and on NumPy arrays of contribution pairs of any
+    # shape alike, and the serving path never needs NumPy. Returns (human score, bot score, group account).
+    group_account = contribution + bot_contribution
+    group_account = group_account * (1 + (multiplier - 1) * (group_account >= threshold))
+    score = initial_tokens - contribution + group_account / 2
+    bot_score = initial_tokens - bot_contribution + group_account / 2
+    return score, bot_score, group_account
+
+
+def round_payoffs(contribution, bot_contribution, **rules):
+    # payoffs() for a single round, as plain floats
+    score, bot_score, group_account = payoffs(contribution, bot_contribution, **rules)
+    return float(score), float(bot_score), float(group_account)
+
+
+def bonus_usd(average_tokens_per_game, tokens_per_usd=tokens_per_usd):
+    return average_tokens_per_game / tokens_per_usd
+
+
+def earnings_usd(bonus, base_payment_usd=base_payment_usd):
+    return base_payment_usd + bonus
+
+
+def accepted_answers(value):
+    # Spellings accepted for a payoff in the control questions: 12.5 -> 12.5, 12,5, 12.50, 12,50
+    if float(value).is_integer():
+        return [str(int(value))]
+    text = f"{value:.2f}".rstrip('0')
+    answers = [text, text.replace('.', ',')]
+    if len(text.split('.')[1]) == 1:
+        answers += [f"{value:.2f}", f"{value:.2f}".replace('.', ',')]
+    return answers
+
+
+# Control questions: (your contribution, AI contribution, whose earnings are asked for)
+control_questions = {
+    'answer1': (5, 5, 'human'),
+    'answer2': (10, 0, 'human'),
+    'answer3': (3, 8, 'ai'),
+    'answer4': (0, 0, 'human')
+}
+
+
+def control_answer_key():
+    answer_key = {}
+    for name, (contribution, bot_contribution, player) in control_questions.items():
+        score, bot_score, _ = round_payoffs(contribution, bot_contribution)
+        answer_key[name] = accepted_answers(score if player == 'human' else bot_score)
+    return answer_key
@@ -0,0 +1,53 @@
+# Loaded automatically by gunicorn from the working directory (Procfile: gunicorn app:app)
+import gc
+import os
+import glob
+import tempfile
+
+
+# Prometheus multiprocess mode: every worker writes its metrics to files in this directory and
+# /metrics adds them up, so the numbers cover all workers rather than whichever one answered
+if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='pgg-metrics-')
+
+
+# Request threads per worker (gthread above 1). Bot decisions never hold a request thread, and
+# with DECISION_MODE=async they do not hold a thread at all while OpenAI answers, so a few
+# threads per worker go a long way.
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+# GUNICORN_PRELOAD=1 imports the app once in the master and forks the workers from it, so they
+# start faster and share the imported code copy-on-write (same as passing --preload)
+preload_app = os.getenv('GUNICORN_PRELOAD', '0') == '1'
+
+
+def on_starting(server):
+    # Start from empty counters; files left by an earlier run would be added in
+    for path in glob.glob(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], '*.db')):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of a worker that exited
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    # The app defers the OpenAI SDK to warm_up(); with a preloaded app, import it once here
+    # instead, before any worker is forked, so they all inherit it
+    if server.cfg.preload_app:
+        import llm_client  # noqa: F401 -- imported for its side effect, ahead of gc.freeze() in pre_fork
+
+
+def pre_fork(server, worker):
+    # With a preloaded app, keep the garbage collector from touching (and so copying) the
+    # master's objects in every worker
+    if server.cfg.preload_app:
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    # Open connections and compile templates before the worker takes its first request
+    from app import warm_up
+    warm_up(worker.wsgi)
@@ -0,0 +1,161 @@
+import os
+import csv
+import time
+import datetime
+import threading
+from flask import current_app
+from sqlalchemy import func
+from models import db, Participant, HistoricAverage, upsert
+from event_log import log_error
+
+
+# Baselines are read from the historic_average table, which every worker shares, and kept
+# in this process for refresh_interval seconds. The 'study' rows are recomputed from finished
+# participants by `flask refresh-historic-averages` or by a background thread in each process
+# once they are older than recompute_interval (0 leaves it to the command), so no request
+# aggregates over participant rows. Until a group has min_rounds finished rounds, seeded values from earlier
+# studies are used, and the fixed default before any exist.
+refresh_interval = int(os.getenv('HISTORIC_REFRESH', 300))
+recompute_interval = int(os.getenv('HISTORIC_RECOMPUTE', 3600))
+min_rounds = int(os.getenv('HISTORIC_MIN_ROUNDS', 100))
+default_average = float(os.getenv('HISTORIC_AVG_DEFAULT', 8.1))
+
+ALL_GROUPS = 'all'
+ALL_SESSIONS = 0
+
+_averages = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+_recompute_pid = None
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
+
+def upsert_historic_average(source, group, session_num, human_avg_contribution, ai_avg_contribution, rounds=None):
+    # Caller commits. Workers recomputing at the same time write the same values, so the
+    # last one wins instead of the others failing on the unique constraint.
+    upsert(HistoricAverage, {
+        'source': source,
+        'group': group,
+        'session_num': session_num,
+        'human_avg_contribution': human_avg_contribution,
+        'ai_avg_contribution': ai_avg_contribution,
+        'rounds': rounds,
+        'updated_at': _utcnow()
+    }, ['source', 'group', 'session_num'])
+
+
+def recompute_study_averages():
+    # Averages over every participant who reached the result page, per group and session,
+    # plus the across-group and across-session totals. Returns the number of rows written.
+    finished = db.session.query(Participant.participant_id).filter(
+        Participant.end_timestamp.isnot(None)
+    ).distinct()
+    rows = db.session.query(
+        Participant.group, Participant.session_num,
+        func.sum(Participant.contribution), func.sum(Participant.bot_contribution), func.count()
+    ).filter(Participant.participant_id.in_(finished)).group_by(Participant.group, Participant.session_num).all()
+
+    totals = {}
+    for group, session_num, contribution_sum, bot_contribution_sum, rounds in rows:
+        for key in ((group, session_num), (group, ALL_SESSIONS), (ALL_GROUPS, session_num), (ALL_GROUPS, ALL_SESSIONS)):
+            total = totals.setdefault(key, [0, 0, 0])
+            total[0] += contribution_sum
+            total[1] += bot_contribution_sum
+            total[2] += rounds
+
+    try:
+        for (group, session_num), (contribution_sum, bot_contribution_sum, rounds) in totals.items():
+            upsert_historic_average('study', group, session_num, contribution_sum / rounds, bot_contribution_sum / rounds, rounds)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        log_error('db_error', f"Unexpected error: {e}", operation='recompute_study_averages')
+        return 0
+    return len(totals)
+
+
+def seed_from_csv(path):
+    # Load baselines from earlier studies. Columns: group, session_num, human_avg_contribution,
+    # ai_avg_contribution and optionally rounds; an empty group or session_num means all of them.
+    count = 0
+    with open(path, newline='') as csv_file:
+        for record in csv.DictReader(csv_file):
+            upsert_historic_average(
+                'seed',
+                (record.get('group') or '').strip() or ALL_GROUPS,
+                int(record.get('session_num') or ALL_SESSIONS),
+                float(record['human_avg_contribution']),
+                float(record['ai_avg_contribution']),
+                int(record['rounds']) if record.get('rounds') else None
+            )
+            count += 1
+    db.session.commit()
+    return count
+
+
+def _study_is_stale():
+    study_updated = db.session.query(func.max(HistoricAverage.updated_at)).filter_by(source='study').scalar()
+    return study_updated is None or (_utcnow() - study_updated).total_seconds() > recompute_interval
+
+
+def _recompute_forever(app):
+    global _loaded_at
+    while True:
+        with app.app_context():
+            try:
+                # Every process checks; once one has recomputed, the others find the rows fresh
+                if _study_is_stale():
+                    recompute_study_averages()
+                    _loaded_at = 0.0  # Next request reads the new rows
+            except Exception as e:
+                db.session.rollback()
+                log_error('historic_averages_error', f"Could not recompute historic averages: {e}")
+        time.sleep(min(refresh_interval, recompute_interval))
+
+
+def _start_recompute(app):
+    # One thread per process, started on first use so that a forked worker gets its own
+    global _recompute_pid
+    if recompute_interval <= 0 or _recompute_pid == os.getpid():
+        return
+    threading.Thread(target=_recompute_forever, args=(app,), name='historic-averages', daemon=True).start()
+    _recompute_pid = os.getpid()
+
+
+def _load():
+    global _averages, _loaded_at
+    # Plain values, so the table outlives the session the rows were read in
+    averages = {}
+    for row in HistoricAverage.query.all():
+        averages[(row.source, row.group, row.session_num)] = (row.human_avg_contribution, row.ai_avg_contribution, row.rounds or 0)
+    _averages = averages
+    _loaded_at = time.monotonic()
+
+
+def _averages_table():
+    with _lock:
+        _start_recompute(current_app._get_current_object())
+        if _averages is None or time.monotonic() - _loaded_at > refresh_interval:
+            try:
+                _load()
+            except Exception as e:
+                db.session.rollback()
+                log_error('historic_averages_error', f"Could not load historic averages: {e}")
+        return _averages or {}
+
+
+def historic_averages(group=None, session_num=None):
+    # (human, ai) baseline contributions for a group and session, each rounded to one decimal.
+    # The most specific study row with enough rounds wins, then the most specific seed row.
+    averages = _averages_table()
+    keys = [(group, session_num), (group, ALL_SESSIONS), (ALL_GROUPS, session_num), (ALL_GROUPS, ALL_SESSIONS)]
+    for source in ('study', 'seed'):
+        for key in keys:
+            row = averages.get((source,) + key)
+            if row is None or (source == 'study' and row[2] < min_rounds):
+                continue
+            return round(row[0], 1), round(row[1], 1)
+    return default_average, default_average
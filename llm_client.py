@@ -0,0 +1,236 @@
+import os
+import time
+import asyncio
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import httpx
+import openai
+from openai import OpenAI, AsyncOpenAI
+from event_log import log_event
+
+
+# Errors worth another attempt; anything else (bad request, auth) fails straight away
+retryable_errors = (
+    openai.APIConnectionError,  # Includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class HedgePolicy:
+    # When to send a hedged request: after a fixed delay, or once the first attempt is slower
+    # than the given percentile of recent latencies (after enough samples to tell)
+    def __init__(self, hedge_after=None, hedge_percentile=0.95, hedge_min_samples=20, latency_window=200):
+        self.hedge_after = hedge_after
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies = deque(maxlen=latency_window)
+        self._latencies_lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._latencies_lock:
+            self._latencies.append(seconds)
+
+    def delay(self):
+        # Seconds to wait before hedging, or None when hedging is off or not yet calibrated
+        if self.hedge_after is not None:
+            return self.hedge_after
+        if not self.hedge_percentile:
+            return None
+        with self._latencies_lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile))
+        return ordered[index]
+
+
+def _backoff_pause(backoff, attempt):
+    return backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def _deadline(total_timeout, deadline):
+    own = time.monotonic() + total_timeout
+    return own if deadline is None else min(own, deadline)
+
+
+class DecisionClient:
+    # Chat-completion client for bot decisions: one pooled HTTP transport per process,
+    # explicit connect/read timeouts, bounded retries with jittered backoff, and optional
+    # hedging, where a second identical request is sent if the first is slower than usual
+    # and whichever answers first wins.
+    def __init__(self, api_key=None, base_url=None, connect_timeout=3.0, read_timeout=10.0,
+                 total_timeout=20.0, max_retries=2, backoff=0.25, pool_size=20,
+                 hedge_after=None, hedge_percentile=0.95, hedge_min_samples=20, latency_window=200):
+        self.http_client = httpx.Client(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+        # Retries are handled here so they can share one deadline with hedged attempts
+        self.openai = OpenAI(api_key=api_key, base_url=base_url, http_client=self.http_client, max_retries=0)
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedge = HedgePolicy(hedge_after, hedge_percentile, hedge_min_samples, latency_window)
+        self._attempts = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='openai')
+
+    def hedge_delay(self):
+        return self.hedge.delay()
+
+    def _attempt(self, model, messages, kwargs):
+        started = time.monotonic()
+        completion = self.openai.chat.completions.create(model=model, messages=messages, **kwargs)
+        self.hedge.record(time.monotonic() - started)
+        return completion
+
+    def _hedged_attempt(self, model, messages, kwargs, deadline, admit):
+        first = self._attempts.submit(self._attempt, model, messages, kwargs)
+        futures = {first}
+
+        delay = self.hedge_delay()
+        if delay is not None:
+            done, _ = wait(futures, timeout=max(0.0, min(delay, deadline - time.monotonic())))
+            if not done and time.monotonic() < deadline and (admit is None or admit(False)):
+                futures.add(self._attempts.submit(self._attempt, model, messages, kwargs))
+
+        # The first successful answer wins; a failure only counts once every attempt has failed
+        error = None
+        while futures:
+            done, futures = wait(futures, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise openai.APITimeoutError(request=httpx.Request('POST', str(self.openai.base_url)))
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def create(self, messages, model="gpt-4o", admit=None, deadline=None, **kwargs):
+        # admit(blocking) is an optional rate-budget hook for the extra requests made here: it
+        # is called with True before a retry (and may wait) and with False before a hedge
+        # (must answer at once; the hedge is skipped when it returns False). deadline, a
+        # time.monotonic() value, cuts total_timeout short when the caller stops waiting earlier.
+        deadline = _deadline(self.total_timeout, deadline)
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._hedged_attempt(model, messages, kwargs, deadline, admit)
+            except retryable_errors as e:
+                pause = _backoff_pause(self.backoff, attempt)
+                if attempt == self.max_retries or time.monotonic() + pause >= deadline:
+                    raise
+                log_event('openai_retry', "OpenAI request failed, retrying", logging.WARNING, error=e.__class__.__name__, pause_ms=round(pause * 1000))
+                time.sleep(pause)
+                if admit is not None:
+                    admit(True)
+
+    def warm_up(self):
+        # Opens a pooled connection (TLS handshake included) ahead of the first decision; any
+        # HTTP answer will do. Returns False if the server could not be reached.
+        try:
+            self.http_client.get(str(self.openai.base_url))
+            return True
+        except httpx.HTTPError:
+            return False
+
+    def close(self):
+        self._attempts.shutdown(wait=False)
+        self.http_client.close()
+
+
+class AsyncDecisionClient:
+    # DecisionClient for an asyncio event loop, on AsyncOpenAI and a pooled httpx.AsyncClient.
+    # Same timeouts, retries and hedging, but a waiting request holds a socket instead of a
+    # thread, and the losing attempt of a hedge is cancelled.
+    def __init__(self, api_key=None, base_url=None, connect_timeout=3.0, read_timeout=10.0,
+                 total_timeout=20.0, max_retries=2, backoff=0.25, pool_size=200,
+                 hedge_after=None, hedge_percentile=0.95, hedge_min_samples=20, latency_window=200):
+        self.http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+        self.openai = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self.http_client, max_retries=0)
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedge = HedgePolicy(hedge_after, hedge_percentile, hedge_min_samples, latency_window)
+
+    async def _attempt(self, model, messages, kwargs):
+        started = time.monotonic()
+        completion = await self.openai.chat.completions.create(model=model, messages=messages, **kwargs)
+        self.hedge.record(time.monotonic() - started)
+        return completion
+
+    async def _hedged_attempt(self, model, messages, kwargs, deadline, admit):
+        attempts = {asyncio.ensure_future(self._attempt(model, messages, kwargs))}
+        try:
+            delay = self.hedge.delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(attempts, timeout=max(0.0, min(delay, deadline - time.monotonic())))
+                if not done and time.monotonic() < deadline and (admit is None or await admit(False)):
+                    attempts.add(asyncio.ensure_future(self._attempt(model, messages, kwargs)))
+
+            # The first successful answer wins; a failure only counts once every attempt has failed
+            error = None
+            while attempts:
+                done, attempts = await asyncio.wait(attempts, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise openai.APITimeoutError(request=httpx.Request('POST', str(self.openai.base_url)))
+                for attempt in done:
+                    if attempt.exception() is None:
+                        return attempt.result()
+                    error = attempt.exception()
+            raise error
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    async def create(self, messages, model="gpt-4o", admit=None, deadline=None, **kwargs):
+        # admit is an optional coroutine function with the same contract as in DecisionClient.create
+        deadline = _deadline(self.total_timeout, deadline)
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._hedged_attempt(model, messages, kwargs, deadline, admit)
+            except retryable_errors as e:
+                pause = _backoff_pause(self.backoff, attempt)
+                if attempt == self.max_retries or time.monotonic() + pause >= deadline:
+                    raise
+                log_event('openai_retry', "OpenAI request failed, retrying", logging.WARNING, error=e.__class__.__name__, pause_ms=round(pause * 1000))
+                await asyncio.sleep(pause)
+                if admit is not None:
+                    await admit(True)
+
+    async def warm_up(self):
+        try:
+            await self.http_client.get(str(self.openai.base_url))
+            return True
+        except httpx.HTTPError:
+            return False
+
+    async def close(self):
+        await self.http_client.aclose()
+
+
+def _client_options_from_env():
+    hedge_after = os.getenv('OPENAI_HEDGE_AFTER')
+    return {
+        'api_key': os.environ.get('OPENAI_API_KEY'),
+        'base_url': os.getenv('OPENAI_BASE_URL') or None,  # e.g. a local stand-in server for load tests
+        'connect_timeout': float(os.getenv('OPENAI_CONNECT_TIMEOUT', 3)),
+        'read_timeout': float(os.getenv('OPENAI_READ_TIMEOUT', 10)),
+        'total_timeout': float(os.getenv('OPENAI_TOTAL_TIMEOUT', 20)),
+        'max_retries': int(os.getenv('OPENAI_MAX_RETRIES', 2)),
+        'hedge_after': float(hedge_after) if hedge_after else None,
+        'hedge_percentile': float(os.getenv('OPENAI_HEDGE_PERCENTILE', 0.95))
+    }
+
+
+def decision_client_from_env():
+    return DecisionClient(pool_size=int(os.getenv('OPENAI_POOL_SIZE', 20)), **_client_options_from_env())
+
+
+def async_decision_client_from_env(pool_size):
+    # Must be created on the event loop that will use it
+    return AsyncDecisionClient(pool_size=pool_size, **_client_options_from_env())
@@ -0,0 +1,121 @@
+import os
+import time
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST, REGISTRY
+from prometheus_client import multiprocess
+
+
+# Prometheus metrics for requests, database, rendering and bot decisions. Under gunicorn,
+# gunicorn.conf.py sets PROMETHEUS_MULTIPROC_DIR so every worker writes its samples to shared
+# files and /metrics adds them up across workers; without it the metrics are per process.
+multiprocess_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+count_buckets = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+request_latency = Histogram('pgg_http_request_duration_seconds', 'Request latency by Flask endpoint',
+                            ['endpoint', 'method', 'status'], buckets=latency_buckets)
+requests_in_flight = Gauge('pgg_http_requests_in_flight', 'Requests being served', multiprocess_mode='livesum')
+
+db_statements = Histogram('pgg_db_statements_per_request', 'SQL statements issued while serving a request',
+                          ['endpoint'], buckets=count_buckets)
+db_time = Histogram('pgg_db_time_per_request_seconds', 'Time spent in SQL statements while serving a request',
+                    ['endpoint'], buckets=latency_buckets)
+background_db_statements = Counter('pgg_db_background_statements', 'SQL statements issued outside requests (decision threads, commands)')
+background_db_time = Counter('pgg_db_background_seconds', 'Time spent in SQL statements outside requests')
+
+render_latency = Histogram('pgg_template_render_seconds', 'Template rendering time', ['template'], buckets=latency_buckets)
+
+openai_latency = Histogram('pgg_openai_request_seconds', 'OpenAI decision requests, including retries and hedges',
+                           ['outcome'], buckets=latency_buckets)
+openai_scheduler_wait = Histogram('pgg_openai_scheduler_wait_seconds', 'Time waited for the shared OpenAI rate budget',
+                                  buckets=latency_buckets)
+bot_decisions = Counter('pgg_bot_decisions', 'Bot decisions by the strategy that answered', ['source'])
+decisions_in_flight = Gauge('pgg_decisions_in_flight', 'Bot decisions being worked on', ['kind'], multiprocess_mode='livesum')
+
+
+def openai_outcome(error):
+    # 'ok', 'timeout' or 'error' for the openai_latency histogram
+    if error is None:
+        return 'ok'
+    import openai  # Already loaded by whoever made the request
+    return 'timeout' if isinstance(error, (openai.APITimeoutError, TimeoutError)) else 'error'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if has_request_context() and 'metrics_db_statements' in g:
+        g.metrics_db_statements += 1
+        g.metrics_db_time += elapsed
+    else:
+        background_db_statements.inc()
+        background_db_time.inc(elapsed)
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_db_statements = 0
+    g.metrics_db_time = 0.0
+    g.metrics_observed = False
+    requests_in_flight.inc()
+
+
+def _observe(status):
+    if g.get('metrics_observed', True):
+        return
+    g.metrics_observed = True
+    endpoint = request.endpoint or 'unmatched'
+    request_latency.labels(endpoint, request.method, str(status)).observe(time.perf_counter() - g.metrics_started)
+    db_statements.labels(endpoint).observe(g.metrics_db_statements)
+    db_time.labels(endpoint).observe(g.metrics_db_time)
+
+
+def _after_request(response):
+    _observe(response.status_code)
+    return response
+
+
+def _teardown_request(error):
+    if 'metrics_started' not in g:
+        return
+    _observe(500)  # Only still unobserved when the view raised
+    requests_in_flight.dec()
+
+
+def _before_render(sender, template, context, **extra):
+    if has_request_context():
+        g.metrics_render_started = time.perf_counter()
+
+
+def _rendered(sender, template, context, **extra):
+    if has_request_context() and 'metrics_render_started' in g:
+        render_latency.labels(template.name or 'string').observe(time.perf_counter() - g.pop('metrics_render_started'))
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+
+def metrics_text():
+    # (body, content type) for the /metrics endpoint
+    if multiprocess_dir:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,64 @@
+"""Move INCOM answers from participant rows into a questionnaire table
+
+Revision ID: 0b5d9e2f7c41
+Revises: f3a6b8c1d290
+Create Date: 2026-10-18 17:48:30.116204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b5d9e2f7c41'
+down_revision = 'f3a6b8c1d290'
+branch_labels = None
+depends_on = None
+
+
+incom_columns = ['incom_1', 'incom_2', 'incom_3', 'incom_4', 'incom_5', 'incom_6']
+
+
+def upgrade():
+    op.create_table('questionnaire',
+    sa.Column('participant_id', sa.String(length=16), nullable=False),
+    sa.Column('prolific_pid', sa.String(length=64), nullable=True),
+    sa.Column('session_id', sa.String(length=64), nullable=True),
+    sa.Column('incom_1', sa.Integer(), nullable=True),
+    sa.Column('incom_2', sa.Integer(), nullable=True),
+    sa.Column('incom_3', sa.Integer(), nullable=True),
+    sa.Column('incom_4', sa.Integer(), nullable=True),
+    sa.Column('incom_5', sa.Integer(), nullable=True),
+    sa.Column('incom_6', sa.Integer(), nullable=True),
+    sa.Column('submitted_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('participant_id')
+    )
+
+    # Every round row of a participant carries the same answers; keep one copy of them
+    op.execute(
+        "INSERT INTO questionnaire (participant_id, prolific_pid, session_id, "
+        + ", ".join(incom_columns) + ") "
+        "SELECT participant_id, MIN(prolific_pid), MIN(session_id), "
+        + ", ".join(f"MAX({column})" for column in incom_columns) + " "
+        "FROM participant WHERE "
+        + " OR ".join(f"{column} IS NOT NULL" for column in incom_columns) + " "
+        "GROUP BY participant_id"
+    )
+
+    with op.batch_alter_table('participant', schema=None) as batch_op:
+        for column in incom_columns:
+            batch_op.drop_column(column)
+
+
+def downgrade():
+    with op.batch_alter_table('participant', schema=None) as batch_op:
+        for column in incom_columns:
+            batch_op.add_column(sa.Column(column, sa.INTEGER(), nullable=True))
+
+    for column in incom_columns:
+        op.execute(
+            f"UPDATE participant SET {column} = (SELECT questionnaire.{column} FROM questionnaire "
+            "WHERE questionnaire.participant_id = participant.participant_id)"
+        )
+
+    op.drop_table('questionnaire')
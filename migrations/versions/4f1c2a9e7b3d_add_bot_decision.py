@@ -0,0 +1,35 @@
+"""Add bot_decision table for prefetched bot moves
+
+Revision ID: 4f1c2a9e7b3d
+Revises: 06db408c2d7b
+Create Date: 2026-10-18 09:12:04.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4f1c2a9e7b3d'
+down_revision = '06db408c2d7b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('bot_decision',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('participant_id', sa.String(length=16), nullable=False),
+    sa.Column('session_num', sa.Integer(), nullable=False),
+    sa.Column('round_num', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('bot_contribution', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('participant_id', 'session_num', 'round_num', name='_bot_decision_session_round_uc')
+    )
+
+
+def downgrade():
+    op.drop_table('bot_decision')
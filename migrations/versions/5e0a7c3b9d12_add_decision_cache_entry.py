@@ -0,0 +1,36 @@
+"""Add decision_cache_entry table for shared bot decisions
+
+Revision ID: 5e0a7c3b9d12
+Revises: c2d84f6a1e95
+Create Date: 2026-10-18 12:40:51.302877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0a7c3b9d12'
+down_revision = 'c2d84f6a1e95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('decision_cache_entry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cache_key', sa.String(length=64), nullable=False),
+    sa.Column('bot_contribution', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('last_used_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('decision_cache_entry', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_decision_cache_entry_cache_key'), ['cache_key'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('decision_cache_entry', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_decision_cache_entry_cache_key'))
+
+    op.drop_table('decision_cache_entry')
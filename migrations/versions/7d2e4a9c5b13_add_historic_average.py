@@ -0,0 +1,35 @@
+"""Add historic_average table for baseline contributions
+
+Revision ID: 7d2e4a9c5b13
+Revises: 0b5d9e2f7c41
+Create Date: 2026-10-18 18:20:04.557731
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2e4a9c5b13'
+down_revision = '0b5d9e2f7c41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('historic_average',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('source', sa.String(length=16), nullable=False),
+    sa.Column('group', sa.String(length=50), nullable=False),
+    sa.Column('session_num', sa.Integer(), nullable=False),
+    sa.Column('human_avg_contribution', sa.Float(), nullable=False),
+    sa.Column('ai_avg_contribution', sa.Float(), nullable=False),
+    sa.Column('rounds', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('source', 'group', 'session_num', name='_historic_average_uc')
+    )
+
+
+def downgrade():
+    op.drop_table('historic_average')
@@ -0,0 +1,31 @@
+"""Add conversation_state table for server-side game history
+
+Revision ID: 9b7e3d51c0a4
+Revises: 4f1c2a9e7b3d
+Create Date: 2026-10-18 10:03:47.520911
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b7e3d51c0a4'
+down_revision = '4f1c2a9e7b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('conversation_state',
+    sa.Column('participant_id', sa.String(length=16), nullable=False),
+    sa.Column('previous_messages', sa.JSON(), nullable=False),
+    sa.Column('game_history', sa.JSON(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('participant_id')
+    )
+
+
+def downgrade():
+    op.drop_table('conversation_state')
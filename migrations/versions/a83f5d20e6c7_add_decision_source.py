@@ -0,0 +1,32 @@
+"""Record which bot strategy produced each decision
+
+Revision ID: a83f5d20e6c7
+Revises: 5e0a7c3b9d12
+Create Date: 2026-10-18 13:58:22.671390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a83f5d20e6c7'
+down_revision = '5e0a7c3b9d12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('participant', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('decision_source', sa.String(length=32), nullable=True))
+
+    with op.batch_alter_table('bot_decision', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('source', sa.String(length=32), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('bot_decision', schema=None) as batch_op:
+        batch_op.drop_column('source')
+
+    with op.batch_alter_table('participant', schema=None) as batch_op:
+        batch_op.drop_column('decision_source')
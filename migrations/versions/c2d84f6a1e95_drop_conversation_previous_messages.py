@@ -0,0 +1,26 @@
+"""Drop stored chat transcript now that prompts are rebuilt from game history
+
+Revision ID: c2d84f6a1e95
+Revises: 9b7e3d51c0a4
+Create Date: 2026-10-18 11:26:09.734402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d84f6a1e95'
+down_revision = '9b7e3d51c0a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversation_state', schema=None) as batch_op:
+        batch_op.drop_column('previous_messages')
+
+
+def downgrade():
+    with op.batch_alter_table('conversation_state', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('previous_messages', sa.JSON(), nullable=False, server_default='[]'))
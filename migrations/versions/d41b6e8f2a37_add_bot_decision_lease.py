@@ -0,0 +1,28 @@
+"""Add owner lease to bot_decision for cross-worker single-flight
+
+Revision ID: d41b6e8f2a37
+Revises: a83f5d20e6c7
+Create Date: 2026-10-18 15:07:33.905126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41b6e8f2a37'
+down_revision = 'a83f5d20e6c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bot_decision', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('owner', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('bot_decision', schema=None) as batch_op:
+        batch_op.drop_column('lease_expires_at')
+        batch_op.drop_column('owner')
@@ -0,0 +1,45 @@
+"""Add rate_budget and decision_ticket tables for the shared OpenAI scheduler
+
+Revision ID: e7c90a4d1b58
+Revises: d41b6e8f2a37
+Create Date: 2026-10-18 16:21:45.218630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c90a4d1b58'
+down_revision = 'd41b6e8f2a37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('rate_budget',
+    sa.Column('name', sa.String(length=32), nullable=False),
+    sa.Column('requests_available', sa.Float(), nullable=False),
+    sa.Column('tokens_available', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('decision_ticket',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('scheduler', sa.String(length=32), nullable=False),
+    sa.Column('priority', sa.Integer(), nullable=False),
+    sa.Column('enqueued_at', sa.DateTime(), nullable=False),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('decision_ticket', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_decision_ticket_scheduler'), ['scheduler'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('decision_ticket', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_decision_ticket_scheduler'))
+
+    op.drop_table('decision_ticket')
+    op.drop_table('rate_budget')
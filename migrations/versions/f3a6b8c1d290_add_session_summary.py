@@ -0,0 +1,45 @@
+"""Add session_summary table with running totals per participant session
+
+Revision ID: f3a6b8c1d290
+Revises: e7c90a4d1b58
+Create Date: 2026-10-18 17:05:12.483910
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a6b8c1d290'
+down_revision = 'e7c90a4d1b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('session_summary',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('participant_id', sa.String(length=16), nullable=False),
+    sa.Column('session_num', sa.Integer(), nullable=False),
+    sa.Column('rounds', sa.Integer(), nullable=False),
+    sa.Column('contribution_sum', sa.Integer(), nullable=False),
+    sa.Column('bot_contribution_sum', sa.Integer(), nullable=False),
+    sa.Column('participant_balance_sum', sa.Float(), nullable=False),
+    sa.Column('bot_balance_sum', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('participant_id', 'session_num', name='_session_summary_uc')
+    )
+
+    # Backfill the totals of rounds saved before the table existed
+    op.execute(
+        "INSERT INTO session_summary (participant_id, session_num, rounds, contribution_sum, bot_contribution_sum, "
+        "participant_balance_sum, bot_balance_sum, updated_at) "
+        "SELECT participant_id, session_num, COUNT(*), SUM(contribution), SUM(bot_contribution), "
+        "SUM(participant_balance), SUM(bot_balance), CURRENT_TIMESTAMP "
+        "FROM participant GROUP BY participant_id, session_num"
+    )
+
+
+def downgrade():
+    op.drop_table('session_summary')
@@ -1,6 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import func
+import datetime
+from event_log import log_event, log_error
 
 db = SQLAlchemy()
 
@@ -21,69 +23,423 @@ class Participant(db.Model):
     start_timestamp = db.Column(db.DateTime, nullable=True)
     end_timestamp = db.Column(db.DateTime, nullable=True)
     bonus = db.Column(db.Float, nullable=True)
+    decision_source = db.Column(db.String(32), nullable=True)  # Strategy that produced bot_contribution
+
+    __table_args__ = (db.UniqueConstraint('participant_id', 'session_num', 'round_num', name='_participant_session_round_uc'),)
+
+    def __repr__(self):
+        return f'<Participant {self.participant_id} - Session {self.session_num}, Round {self.round_num}>'
+
+class Questionnaire(db.Model):
+    # INCOM answers, stored once per participant rather than on every round row
+    __tablename__ = 'questionnaire'
+    participant_id = db.Column(db.String(16), primary_key=True)
+    prolific_pid = db.Column(db.String(64), nullable=True)
+    session_id = db.Column(db.String(64), nullable=True)
     incom_1 = db.Column(db.Integer, nullable=True)
     incom_2 = db.Column(db.Integer, nullable=True)
-    incom_3 = db.Column(db.Integer, nullable=True)
+    incom_3 = db.Column(db.Integer, nullable=True)  # Stored reverse-coded
     incom_4 = db.Column(db.Integer, nullable=True)
     incom_5 = db.Column(db.Integer, nullable=True)
     incom_6 = db.Column(db.Integer, nullable=True)
+    submitted_at = db.Column(db.DateTime, nullable=True)  # Unknown for answers backfilled from round rows
 
-    __table_args__ = (db.UniqueConstraint('participant_id', 'session_num', 'round_num', name='_participant_session_round_uc'),)
+    def __repr__(self):
+        return f'<Questionnaire {self.participant_id}>'
+
+class SessionSummary(db.Model):
+    # Running totals of one participant's session, kept in step with the participant rows
+    # so result pages and prompts read one row instead of aggregating every round
+    __tablename__ = 'session_summary'
+    id = db.Column(db.Integer, primary_key=True)
+    participant_id = db.Column(db.String(16), nullable=False)
+    session_num = db.Column(db.Integer, nullable=False)
+    rounds = db.Column(db.Integer, nullable=False)
+    contribution_sum = db.Column(db.Integer, nullable=False)
+    bot_contribution_sum = db.Column(db.Integer, nullable=False)
+    participant_balance_sum = db.Column(db.Float, nullable=False)
+    bot_balance_sum = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('participant_id', 'session_num', name='_session_summary_uc'),)
+
+    @property
+    def human_avg_contribution(self):
+        return self.contribution_sum / self.rounds if self.rounds else 0.0
+
+    @property
+    def ai_avg_contribution(self):
+        return self.bot_contribution_sum / self.rounds if self.rounds else 0.0
 
     def __repr__(self):
-        return f'<Participant {self.participant_id} - Session {self.session_num}, Round {self.round_num}>'
+        return f'<SessionSummary {self.participant_id} - Session {self.session_num}: {self.rounds} rounds>'
 
-def save_participant_data(prolific_pid, session_id, participant_id, session_num, round_num, contribution, bot_contribution, participant_balance, bot_balance, net_gain, group, start_timestamp, end_timestamp, incom_1, incom_2, incom_3, incom_4, incom_5, incom_6):
-    try:
-        # Check if the record already exists
-        existing_entry = Participant.query.filter_by(
-            participant_id=participant_id,
-            session_num=session_num,
-            round_num=round_num
-        ).first()
-
-        if not existing_entry:
-            # If no record exists, insert a new entry
-            participant_entry = Participant(
-                prolific_pid=prolific_pid,
-                session_id=session_id,
-                participant_id=participant_id,
-                group=group,
-                session_num=session_num,
-                round_num=round_num,
-                contribution=contribution,
-                bot_contribution=bot_contribution,
-                participant_balance=participant_balance,
-                bot_balance=bot_balance,
-                net_gain=net_gain,
-                start_timestamp=start_timestamp,
-                end_timestamp=end_timestamp,
-                incom_1=incom_1, 
-                incom_2=incom_2, 
-                incom_3=incom_3, 
-                incom_4=incom_4, 
-                incom_5=incom_5, 
-                incom_6=incom_6
-            )
-            db.session.add(participant_entry)
-            db.session.commit()  # Commit the session
-        else:
-            print(f"Record already exists for participant_id={participant_id}, session_num={session_num}, round_num={round_num}")
+class HistoricAverage(db.Model):
+    # Baseline contributions shown to participants. 'study' rows are computed from finished
+    # participants of this study, 'seed' rows come from earlier studies. group 'all' and
+    # session_num 0 hold the averages across groups and sessions.
+    __tablename__ = 'historic_average'
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(16), nullable=False)
+    group = db.Column(db.String(50), nullable=False)
+    session_num = db.Column(db.Integer, nullable=False)
+    human_avg_contribution = db.Column(db.Float, nullable=False)
+    ai_avg_contribution = db.Column(db.Float, nullable=False)
+    rounds = db.Column(db.Integer, nullable=True)  # Rounds behind the averages, if known
+    updated_at = db.Column(db.DateTime, nullable=False)  # Naive UTC
+
+    __table_args__ = (db.UniqueConstraint('source', 'group', 'session_num', name='_historic_average_uc'),)
+
+    def __repr__(self):
+        return f'<HistoricAverage {self.source} {self.group} - Session {self.session_num}>'
+
+class BotDecision(db.Model):
+    __tablename__ = 'bot_decision'
+    id = db.Column(db.Integer, primary_key=True)
+    participant_id = db.Column(db.String(16), nullable=False)
+    session_num = db.Column(db.Integer, nullable=False)
+    round_num = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(16), nullable=False)  # 'pending' (prefetching), 'deciding', 'ready' or 'failed'
+    bot_contribution = db.Column(db.Integer, nullable=True)
+    source = db.Column(db.String(32), nullable=True)
+    owner = db.Column(db.String(64), nullable=True)  # Worker currently finishing the round
+    lease_expires_at = db.Column(db.DateTime, nullable=True)  # Naive UTC; another worker may take over after this
+    created_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (db.UniqueConstraint('participant_id', 'session_num', 'round_num', name='_bot_decision_session_round_uc'),)
+
+    def __repr__(self):
+        return f'<BotDecision {self.participant_id} - Session {self.session_num}, Round {self.round_num}: {self.status}>'
+
+class ConversationState(db.Model):
+    __tablename__ = 'conversation_state'
+    participant_id = db.Column(db.String(16), primary_key=True)
+    game_history = db.Column(db.JSON, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<ConversationState {self.participant_id} v{self.version}>'
+
+class DecisionCacheEntry(db.Model):
+    __tablename__ = 'decision_cache_entry'
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(64), nullable=False, index=True)  # sha256 of model, prompt, session and group
+    bot_contribution = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    last_used_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<DecisionCacheEntry {self.cache_key[:12]}: {self.bot_contribution}>'
+
+class RateBudget(db.Model):
+    # Token bucket shared by all workers for an external API budget
+    __tablename__ = 'rate_budget'
+    name = db.Column(db.String(32), primary_key=True)
+    requests_available = db.Column(db.Float, nullable=False)
+    tokens_available = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)  # Naive UTC
+    version = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<RateBudget {self.name}: {self.requests_available:.1f} requests, {self.tokens_available:.0f} tokens>'
+
+class DecisionTicket(db.Model):
+    # A decision waiting for the shared rate budget
+    __tablename__ = 'decision_ticket'
+    id = db.Column(db.Integer, primary_key=True)
+    scheduler = db.Column(db.String(32), nullable=False, index=True)
+    priority = db.Column(db.Integer, nullable=False)
+    enqueued_at = db.Column(db.DateTime, nullable=False)  # Naive UTC
+    heartbeat_at = db.Column(db.DateTime, nullable=False)  # Naive UTC
+
+    def __repr__(self):
+        return f'<DecisionTicket {self.id} ({self.scheduler}, priority {self.priority})>'
 
-    except IntegrityError as e:
+def _dialect_insert():
+    # INSERT construct with ON CONFLICT support for the bound database, or None if it has none
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+def insert_ignoring_conflicts(model, values, conflict_columns):
+    # Single-statement idempotent insert: INSERT ... ON CONFLICT DO NOTHING on Postgres and
+    # SQLite, plain insert-and-catch elsewhere. Returns True if a row was inserted.
+    insert = _dialect_insert()
+    if insert is None:
+        try:
+            with db.session.begin_nested():
+                db.session.add(model(**values))
+            return True
+        except IntegrityError:
+            return False
+
+    statement = insert(model).values(**values).on_conflict_do_nothing(index_elements=conflict_columns)
+    return db.session.execute(statement).rowcount == 1
+
+def upsert(model, values, conflict_columns):
+    # Single-statement insert-or-update: INSERT ... ON CONFLICT DO UPDATE on Postgres and
+    # SQLite, so concurrent writers of the same key never hit the unique constraint; update
+    # first and insert if nothing matched elsewhere. Caller commits.
+    insert = _dialect_insert()
+    if insert is None:
+        key = {column: values[column] for column in conflict_columns}
+        if model.query.filter_by(**key).update(values, synchronize_session=False) == 0:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(model(**values))
+            except IntegrityError:
+                model.query.filter_by(**key).update(values, synchronize_session=False)  # Another writer inserted it first
+        return
+
+    statement = insert(model).values(**values)
+    statement = statement.on_conflict_do_update(
+        index_elements=conflict_columns,
+        set_={name: value for name, value in values.items() if name not in conflict_columns}
+    )
+    db.session.execute(statement)
+
+def save_questionnaire(participant_id, prolific_pid, session_id, answers):
+    # Store the participant's INCOM answers ({'incom_1': ..., ...}); the first submission is kept
+    try:
+        inserted = insert_ignoring_conflicts(Questionnaire, {
+            'participant_id': participant_id,
+            'prolific_pid': prolific_pid,
+            'session_id': session_id,
+            'submitted_at': datetime.datetime.now(datetime.UTC),
+            **answers
+        }, ['participant_id'])
+        db.session.commit()
+        return inserted
+    except Exception as e:
         db.session.rollback()
-        print(f"Error occurred: {e}")
+        log_error('db_error', f"Unexpected error: {e}", operation='save_questionnaire')
+        return False
+
+def add_to_session_summary(participant_id, session_num, contribution, bot_contribution, participant_balance, bot_balance):
+    # Fold one newly saved round into its session's running totals (caller commits)
+    now = datetime.datetime.now(datetime.UTC)
+    increments = {
+        'rounds': 1,
+        'contribution_sum': contribution,
+        'bot_contribution_sum': bot_contribution,
+        'participant_balance_sum': participant_balance,
+        'bot_balance_sum': bot_balance
+    }
+
+    insert = _dialect_insert()
+    if insert is None:
+        updated = SessionSummary.query.filter_by(participant_id=participant_id, session_num=session_num).update(
+            {**{name: getattr(SessionSummary, name) + value for name, value in increments.items()}, 'updated_at': now},
+            synchronize_session=False
+        )
+        if updated == 0:
+            db.session.add(SessionSummary(participant_id=participant_id, session_num=session_num, updated_at=now, **increments))
+        return
+
+    statement = insert(SessionSummary).values(participant_id=participant_id, session_num=session_num, updated_at=now, **increments)
+    statement = statement.on_conflict_do_update(
+        index_elements=['participant_id', 'session_num'],
+        set_={**{name: getattr(SessionSummary, name) + value for name, value in increments.items()}, 'updated_at': now}
+    )
+    db.session.execute(statement)
+
+def save_participant_data(prolific_pid, session_id, participant_id, session_num, round_num, contribution, bot_contribution, participant_balance, bot_balance, net_gain, group, start_timestamp, end_timestamp, decision_source=None):
+    # Insert the round unless it is already saved; returns True if this call inserted it
+    try:
+        inserted = insert_ignoring_conflicts(Participant, {
+            'prolific_pid': prolific_pid,
+            'session_id': session_id,
+            'participant_id': participant_id,
+            'group': group,
+            'session_num': session_num,
+            'round_num': round_num,
+            'contribution': contribution,
+            'bot_contribution': bot_contribution,
+            'participant_balance': participant_balance,
+            'bot_balance': bot_balance,
+            'net_gain': net_gain,
+            'start_timestamp': start_timestamp,
+            'end_timestamp': end_timestamp,
+            'decision_source': decision_source
+        }, ['participant_id', 'session_num', 'round_num'])
+        if inserted:
+            add_to_session_summary(participant_id, session_num, contribution, bot_contribution, participant_balance, bot_balance)
+        db.session.commit()
+
+        if not inserted:
+            log_event('round_exists', "Record already exists", participant_id=participant_id, session_num=session_num, round_num=round_num)
+        return inserted
+
     except Exception as e:
         db.session.rollback()
-        print(f"Unexpected error: {e}")
+        log_error('db_error', f"Unexpected error: {e}", operation='save_participant_data')
+        return False
 
 # Calculate averages for the human and AI player contributions
+def get_session_summaries(participant_id):
+    # {session_num: SessionSummary} for every session the participant has played
+    summaries = SessionSummary.query.filter_by(participant_id=participant_id).all()
+    return {summary.session_num: summary for summary in summaries}
+
+def _summary_average(participant_id, column):
+    total, rounds = db.session.query(func.sum(column), func.sum(SessionSummary.rounds)).filter_by(participant_id=participant_id).one()
+    return total / rounds if rounds else 0.0  # Return 0.0 if no results found
+
 def calculate_human_player_average(participant_id):
     # Calculate the average human contribution for the given participant
-    result = db.session.query(func.avg(Participant.contribution)).filter_by(participant_id=participant_id).first()
-    return result[0] if result[0] is not None else 0.0  # Return 0.0 if no results found
+    return _summary_average(participant_id, SessionSummary.contribution_sum)
+
+def count_bot_contributions(decision_source):
+    # How often the bot made each contribution, for rows produced by the given strategy
+    rows = db.session.query(Participant.bot_contribution, func.count()).filter_by(
+        decision_source=decision_source
+    ).group_by(Participant.bot_contribution).all()
+    return {bot_contribution: count for bot_contribution, count in rows}
 
 def calculate_ai_player_average(participant_id):
     # Calculate the average AI contribution for the given participant
-    result = db.session.query(func.avg(Participant.bot_contribution)).filter_by(participant_id=participant_id).first()
-    return result[0] if result[0] is not None else 0.0  # Return 0.0 if no results found
+    return _summary_average(participant_id, SessionSummary.bot_contribution_sum)
+
+def finalize_participant(participant_id, end_timestamp, bonus, session_num):
+    # Stamp end_timestamp and bonus on the session's rounds in one UPDATE, once the participant
+    # reaches the result page. Returns the number of rows updated.
+    query = Participant.query.filter(Participant.participant_id == participant_id, Participant.session_num == session_num)
+    try:
+        updated = query.update({'end_timestamp': end_timestamp, 'bonus': bonus}, synchronize_session=False)
+        db.session.commit()
+        return updated
+    except Exception as e:
+        db.session.rollback()
+        log_error('db_error', f"Unexpected error: {e}", operation='finalize_participant')
+        return 0
+
+def record_dropout_bonus(participant_id, bonus):
+    # Store the bonus earned by a participant who left before the result page. end_timestamp
+    # stays NULL, since it marks participants who completed the study (exports, baselines).
+    query = Participant.query.filter(Participant.participant_id == participant_id, Participant.bonus.is_(None))
+    try:
+        updated = query.update({'bonus': bonus}, synchronize_session=False)
+        db.session.commit()
+        return updated
+    except Exception as e:
+        db.session.rollback()
+        log_error('db_error', f"Unexpected error: {e}", operation='record_dropout_bonus')
+        return 0
+
+def unfinalized_participants(started_before):
+    # Participants who never reached the result page (no round has an end_timestamp), have
+    # rounds without a bonus yet, and whose latest start is older than the cutoff
+    rows = db.session.query(Participant.participant_id).group_by(Participant.participant_id).having(
+        func.count(Participant.end_timestamp) == 0,
+        func.count(Participant.bonus) < func.count(Participant.id),
+        func.max(Participant.start_timestamp) < started_before
+    ).all()
+    return [participant_id for participant_id, in rows]
+
+# Bot decisions computed ahead of the participant's move, shared by all workers
+def claim_bot_decision(participant_id, session_num, round_num):
+    # Returns True if the caller is the one that should compute this decision
+    now = datetime.datetime.now(datetime.UTC)
+    try:
+        db.session.add(BotDecision(
+            participant_id=participant_id,
+            session_num=session_num,
+            round_num=round_num,
+            status='pending',
+            created_at=now,
+            updated_at=now
+        ))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+def complete_bot_decision(participant_id, session_num, round_num, bot_contribution, status='ready', source=None):
+    # Records the outcome of a decision unless one is already recorded: a slow prefetch must not
+    # overwrite the value another worker has saved the round with. Returns True if it was recorded.
+    try:
+        updated = BotDecision.query.filter(
+            BotDecision.participant_id == participant_id,
+            BotDecision.session_num == session_num,
+            BotDecision.round_num == round_num,
+            BotDecision.status != 'ready'
+        ).update({
+            'status': status,
+            'bot_contribution': bot_contribution,
+            'source': source,
+            'updated_at': datetime.datetime.now(datetime.UTC)
+        }, synchronize_session=False)
+        db.session.commit()
+        return updated == 1
+    except Exception as e:
+        db.session.rollback()
+        log_error('db_error', f"Unexpected error: {e}", operation='complete_bot_decision')
+        return False
+
+def _utcnow():
+    # Lease times are stored as naive UTC so comparisons behave the same on SQLite and Postgres
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
+def claim_round(participant_id, session_num, round_num, owner, lease_seconds):
+    # Single-flight guard for finishing a round: returns True for exactly one caller across
+    # all workers until its lease runs out, so duplicate requests attach instead of deciding again
+    now = _utcnow()
+    expires = now + datetime.timedelta(seconds=lease_seconds)
+    try:
+        db.session.add(BotDecision(
+            participant_id=participant_id,
+            session_num=session_num,
+            round_num=round_num,
+            status='deciding',
+            owner=owner,
+            lease_expires_at=expires,
+            created_at=now,
+            updated_at=now
+        ))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+
+    # The row exists (e.g. from a prefetch); take it over if nobody holds a live lease
+    try:
+        claimed = BotDecision.query.filter(
+            BotDecision.participant_id == participant_id,
+            BotDecision.session_num == session_num,
+            BotDecision.round_num == round_num,
+            db.or_(
+                BotDecision.owner.is_(None),
+                BotDecision.lease_expires_at < now
+            )
+        ).update({'owner': owner, 'lease_expires_at': expires, 'updated_at': now}, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+    except Exception as e:
+        db.session.rollback()
+        log_error('db_error', f"Unexpected error: {e}", operation='claim_round')
+        return False
+
+def round_claim_active(participant_id, session_num, round_num):
+    # True while some worker holds an unexpired lease on finishing this round
+    return db.session.query(BotDecision.id).filter(
+        BotDecision.participant_id == participant_id,
+        BotDecision.session_num == session_num,
+        BotDecision.round_num == round_num,
+        BotDecision.owner.isnot(None),
+        BotDecision.lease_expires_at >= _utcnow()
+    ).first() is not None
+
+def get_bot_decision(participant_id, session_num, round_num):
+    return BotDecision.query.filter_by(
+        participant_id=participant_id,
+        session_num=session_num,
+        round_num=round_num
+    ).first()
@@ -0,0 +1,68 @@
+import gzip
+import hashlib
+from flask import current_app, request, render_template, make_response
+
+# brotli is in requirements.txt; the fallback only lets a dev environment without it serve
+# gzip-compressed pages
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Pages whose HTML is the same for every participant are rendered once per worker and kept
+# together with their compressed variants. Responses carry a strong ETag per variant, so a
+# browser that already has the page gets a 304 without a body. Routes still get a normal
+# response object back and set their cookies on it as before.
+_pages = {}
+
+
+class CachedPage:
+    def __init__(self, body):
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.bodies = {'identity': body}
+        compressed = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(body, quality=11, mode=brotli.MODE_TEXT)
+        for encoding, data in compressed.items():
+            if len(data) < len(body):
+                self.bodies[encoding] = data
+        # Each variant differs byte for byte, so each needs its own strong validator
+        self.etags = {encoding: f'{digest}-{encoding}' for encoding in self.bodies}
+
+
+def cached_page(template, **context):
+    # The context must be the same on every call for a given template. URLs in the page depend
+    # on where the app is mounted, so that is part of the key.
+    key = (template, request.script_root)
+    page = _pages.get(key)
+    if page is None or current_app.debug:
+        page = CachedPage(render_template(template, **context).encode('utf-8'))
+        _pages[key] = page
+    return page
+
+
+def _encoding(page):
+    # Best variant the client accepts; br wins a tie with gzip, identity is always available
+    accepted = request.accept_encodings
+    best, best_quality = 'identity', 0
+    for encoding in ('br', 'gzip'):
+        quality = accepted[encoding]
+        if encoding in page.bodies and quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def page_response(template, **context):
+    # A response for a context-free template, from the cache, compressed if the client allows
+    page = cached_page(template, **context)
+    encoding = _encoding(page)
+
+    response = make_response(page.bodies[encoding])
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(page.etags[encoding])
+    # Revalidate every time: routes set per-participant cookies on these responses
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
@@ -0,0 +1,119 @@
+import re
+from game_engine import initial_tokens, threshold, multiplier
+
+
+# System instructions, sent once at the start of every decision prompt
+system_prompt = (
+    f"You are playing a one-shot public goods game against a human. Each game, you receive {initial_tokens} tokens. "
+    f"You can contribute between 0 and {initial_tokens} tokens to a group account. If the total contribution of both players is {threshold} or more, "
+    f"the total contribution is multiplied by {multiplier}. The remaining tokens in your private account are added to half of the group account. "
+    "Earnings from private and group accounts are summed up and form your game score. Your goal is to maximize your score."
+    "Your goal is to maximize your score over 10 rounds by adapting to the human player's contributions."
+    "Adjust your contribution dynamically based on the human's previous contributions."
+)
+
+move_request = "It's your move. Provide a number between 0 and 10 for your tokens contribution for this game. Do not provide justification, just a number."
+
+
+def history_lines(game_history, session_num, total_games):
+    # One line per finished round; earlier sessions are labelled so the current one reads as before
+    lines = []
+    for game_info in sorted(game_history, key=lambda g: (g.get('session_num', 1), g['game_num'])):
+        game_session = game_info.get('session_num', 1)
+        if game_info['game_num'] > total_games or game_session > session_num:
+            continue
+        prefix = f"Game {game_info['game_num']}" if game_session == session_num else f"Session {game_session}, Game {game_info['game_num']}"
+        lines.append(f"{prefix}: Human contributed {game_info['human_contribution']}, You contributed {game_info['bot_contribution']}.")
+    return lines
+
+
+def build_decision_prompt(game_history, session_num, total_games, ai_avg_contribution=None, historic_ai_avg_contribution=None):
+    # Every round gets the same three-part prompt built from the canonical history, so its
+    # size grows by one short line per round instead of resending every earlier prompt
+    messages = [{"role": "system", "content": system_prompt}]
+
+    if ai_avg_contribution is not None:
+        messages.append({
+            "role": "system",
+            "content": (
+                f"In the previous session, the AI's average contribution was {ai_avg_contribution}, "
+                f"while the historic AI average contribution is {historic_ai_avg_contribution}."
+            )
+        })
+
+    content = "\nHere's the history of your games with this player so far:\n"
+    for line in history_lines(game_history, session_num, total_games):
+        content += line + "\n"
+    content += "\n" + move_request
+
+    messages.append({"role": "user", "content": content})
+    return messages
+
+
+# Token counting uses tiktoken when it is installed and a character estimate otherwise
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encodings = {}
+
+
+def _encoding_for(model):
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except Exception:
+            _encodings[model] = None
+    return _encodings[model]
+
+
+def count_prompt_tokens(messages, model="gpt-4o"):
+    # Chat format adds a few tokens per message plus the assistant reply primer
+    encoding = _encoding_for(model)
+    total = 3
+    for message in messages:
+        total += 3
+        for value in message.values():
+            if encoding is not None:
+                total += len(encoding.encode(value))
+            else:
+                total += (len(value) + 3) // 4
+    return total
+
+
+
+# Single-digit tokens sit at fixed ids in the byte-level vocabularies of gpt-4o and gpt-4
+# ('0' is 15 ... '9' is 24), so they can be biased even when tiktoken is not installed
+digit_token_ids = list(range(15, 25))
+
+
+def decision_request_options(model="gpt-4o", max_contribution=10, max_tokens=2, logit_bias=10):
+    # "Decision mode": the reply is a bare number, so cap it at a couple of tokens, steer
+    # sampling toward the valid numbers and stop at the first line break
+    token_ids = set(digit_token_ids)
+    encoding = _encoding_for(model)
+    if encoding is not None:
+        for value in range(max_contribution + 1):
+            tokens = encoding.encode(str(value))
+            if len(tokens) == 1:
+                token_ids.add(tokens[0])
+
+    options = {'max_tokens': max_tokens, 'stop': ["\n"]}
+    if logit_bias:
+        options['logit_bias'] = {str(token_id): logit_bias for token_id in sorted(token_ids)}
+    return options
+
+
+_number_pattern = re.compile(r'-?\d+(?:[.,]\d+)?')
+
+
+def parse_contribution(text, max_contribution=10):
+    # Take the first number in the reply, round it and clamp it into [0, max_contribution]
+    match = _number_pattern.search(text or '')
+    if match is None:
+        raise ValueError(f"No contribution found in reply: {text!r}")
+    value = round(float(match.group().replace(',', '.')))
+    return min(max(value, 0), max_contribution)
@@ -0,0 +1,191 @@
+import os
+import csv
+import multiprocessing
+import numpy as np
+from sqlalchemy import select
+from models import db, Participant
+from export import apply_filters, iter_chunks, import_pyarrow
+from prompts import build_decision_prompt, decision_request_options, parse_contribution
+from strategies import LLMStrategy, make_strategy
+import game_engine
+from event_log import log_error
+
+
+# Replays the human contribution sequences stored in `participant` against another bot
+# strategy. Sessions are streamed from the database one participant at a time and fanned out
+# over a process pool; every worker builds its own strategy (and OpenAI client, for 'llm',
+# pointed at OPENAI_BASE_URL, e.g. bench/fake_openai.py) once at start-up.
+replay_columns = [
+    'participant_id', 'group', 'session_num', 'round_num', 'contribution',
+    'recorded_bot_contribution', 'recorded_score', 'bot_contribution', 'source',
+    'score', 'bot_score', 'bonus_usd', 'earnings_usd'
+]
+
+_strategy = None
+_settings = None
+
+
+def recorded_participants(total_games=10, **filters):
+    # Yields one dict per participant with its recorded rounds, in session and round order
+    statement = select(
+        Participant.participant_id, Participant.group, Participant.session_num, Participant.round_num,
+        Participant.contribution, Participant.bot_contribution, Participant.participant_balance
+    )
+    statement = apply_filters(statement, **filters).where(Participant.round_num <= total_games).order_by(
+        Participant.participant_id, Participant.session_num, Participant.round_num
+    )
+
+    # The pool reads this from its own thread, outside the app context, so bind the engine now
+    return _group_rounds(iter_chunks(statement, engine=db.engine))
+
+
+def _group_rounds(chunks):
+    current = None
+    for _, rows in chunks:
+        for participant_id, group, session_num, round_num, contribution, bot_contribution, score in rows:
+            if current is None or current['participant_id'] != participant_id:
+                if current is not None:
+                    yield current
+                current = {'participant_id': participant_id, 'group': group, 'rounds': []}
+            current['rounds'].append((session_num, round_num, contribution, bot_contribution, score))
+    if current is not None:
+        yield current
+
+
+def _llm_strategy(settings):
+    from llm_client import decision_client_from_env
+
+    client = decision_client_from_env()
+    options = decision_request_options(settings['model'], max_contribution=game_engine.initial_tokens, max_tokens=2, logit_bias=10)
+
+    def request(context):
+        completion = client.create(context['messages'], model=settings['model'], **options)
+        return parse_contribution(completion.choices[0].message.content, game_engine.initial_tokens)
+
+    return LLMStrategy(request)
+
+
+def _start_worker(strategy_name, settings):
+    # Pool initializer: one strategy per process
+    global _strategy, _settings
+    _settings = settings
+    if strategy_name == 'llm':
+        _strategy = _llm_strategy(settings)
+    else:
+        counts = settings.get('bot_counts') or {}
+        _strategy = make_strategy(strategy_name, counts_loader=lambda: counts)
+
+
+def replay_participant(participant):
+    # Plays the participant's recorded moves against the worker's strategy and prices the
+    # replayed rounds the way result() does. Returns one output row per round.
+    game_history = []
+    rounds = []
+    for session_num, round_num, contribution, recorded_bot_contribution, recorded_score in participant['rounds']:
+        # Session 2 prompts of the experimental group carry the averages, as in the live study
+        ai_avg_contribution = None
+        historic_ai_avg_contribution = None
+        if session_num == 2 and participant['group'] != 'control' and game_history:
+            ai_avg_contribution = round(sum(game['bot_contribution'] for game in game_history) / len(game_history), 1)
+            historic_ai_avg_contribution = _settings['historic_ai_avg'].get(participant['group'], _settings['default_historic_ai_avg'])
+
+        context = {
+            'messages': build_decision_prompt(
+                game_history, session_num, _settings['total_games'],
+                ai_avg_contribution=ai_avg_contribution,
+                historic_ai_avg_contribution=historic_ai_avg_contribution
+            ),
+            'game_history': [game for game in game_history if game['session_num'] == session_num],
+            'session_num': session_num,
+            'round_num': round_num,
+            'group': participant['group']
+        }
+        try:
+            bot_contribution, source = _strategy.decide(context), _strategy.name
+        except Exception as e:
+            log_error('replay_error', f"Replay failed: {e}", participant_id=participant['participant_id'], session_num=session_num, round_num=round_num)
+            bot_contribution, source = None, 'failed'
+
+        rounds.append([session_num, round_num, contribution, recorded_bot_contribution, recorded_score, bot_contribution, source])
+        game_history.append({
+            'game_num': round_num,
+            'human_contribution': contribution,
+            'bot_contribution': bot_contribution if bot_contribution is not None else recorded_bot_contribution,
+            'session_num': session_num
+        })
+
+    contributions = [row[2] for row in rounds]
+    bot_contributions = [row[5] if row[5] is not None else 0 for row in rounds]
+    scores, bot_scores, _ = game_engine.payoffs(np.asarray(contributions, dtype=float), np.asarray(bot_contributions, dtype=float))
+    bonus = float(game_engine.bonus_usd(scores.mean())) if len(rounds) else 0.0
+    earnings = float(game_engine.earnings_usd(bonus))
+
+    return [
+        [participant['participant_id'], participant['group']] + row + [float(score), float(bot_score), bonus, earnings]
+        for row, score, bot_score in zip(rounds, scores, bot_scores)
+    ]
+
+
+def _arrow_schema(pyarrow):
+    integer, number, text = pyarrow.int64(), pyarrow.float64(), pyarrow.string()
+    types = [text, text, integer, integer, integer, integer, number, integer, text, number, number, number, number]
+    return pyarrow.schema(list(zip(replay_columns, types)))
+
+
+def replay(participants, strategy_name, path, workers=None, settings=None, chunksize=None, batch_size=2000):
+    # Replays the participants iterable over a process pool and writes the rounds to `path`
+    # (Parquet, or CSV for a .csv path) as results arrive. Returns (participants, rounds).
+    use_parquet = not path.endswith('.csv')
+    pyarrow = import_pyarrow() if use_parquet else None
+    if use_parquet and pyarrow is None:
+        raise RuntimeError("Parquet output needs pyarrow; install it or write a .csv file instead")
+
+    settings = dict(settings or {})
+    settings.setdefault('model', 'gpt-4o')
+    settings.setdefault('total_games', 10)
+    settings.setdefault('historic_ai_avg', {})
+    settings.setdefault('default_historic_ai_avg', 8.1)
+
+    # LLM replays wait on the network, so hand out one participant at a time to keep every
+    # worker busy; local strategies are fast enough that batching saves on pickling
+    if chunksize is None:
+        chunksize = 1 if strategy_name == 'llm' else 32
+
+    # Spawned workers do not inherit the parent's database connections
+    context = multiprocessing.get_context('spawn')
+    replayed = 0
+    written = 0
+    batch = []
+
+    # Open the output before any work is done, so a missing dependency or an unwritable path
+    # fails straight away rather than after a long replay
+    if use_parquet:
+        output = pyarrow.parquet.ParquetWriter(path, _arrow_schema(pyarrow))
+
+        def write(rows):
+            output.write_table(pyarrow.Table.from_pylist([dict(zip(replay_columns, row)) for row in rows], schema=output.schema))
+    else:
+        csv_file = open(path, 'w', newline='')
+        output = csv.writer(csv_file)
+        output.writerow(replay_columns)
+        write = output.writerows
+
+    try:
+        with context.Pool(workers or os.cpu_count(), initializer=_start_worker, initargs=(strategy_name, settings)) as pool:
+            for rows in pool.imap_unordered(replay_participant, participants, chunksize=chunksize):
+                replayed += 1
+                batch.extend(rows)
+                if len(batch) >= batch_size:
+                    write(batch)
+                    written += len(batch)
+                    batch = []
+        if batch:
+            write(batch)
+            written += len(batch)
+    finally:
+        if use_parquet:
+            output.close()
+        else:
+            csv_file.close()
+
+    return replayed, written
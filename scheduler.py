@@ -0,0 +1,197 @@
+import os
+import time
+import threading
+import datetime
+from collections import deque
+from sqlalchemy.exc import IntegrityError
+from models import db, RateBudget, DecisionTicket
+from event_log import log_error
+
+
+class SchedulerTimeout(Exception):
+    pass
+
+
+def _utcnow():
+    # Naive UTC, matching how the lease and budget columns are stored
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
+
+class RateScheduler:
+    # Shares one OpenAI requests-per-minute and tokens-per-minute budget between all worker
+    # processes through the database. The budget is a token bucket row updated with an
+    # optimistic version check; callers queue as tickets, and only the `head_size` tickets at
+    # the front (highest priority, then oldest) may draw from the bucket, so the queue stays fair.
+    def __init__(self, name='openai', rpm=None, tpm=None, poll_interval=0.1, head_size=8, ticket_ttl=15, stats_window=500):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.poll_interval = poll_interval
+        self.head_size = head_size
+        self.ticket_ttl = ticket_ttl  # Tickets without a heartbeat for this long are ignored
+        self._waits = deque(maxlen=stats_window)
+        self._waits_lock = threading.Lock()
+
+    def _refill(self, available, limit, elapsed):
+        if limit is None:
+            return float('inf')
+        return min(float(limit), available + elapsed * limit / 60.0)
+
+    def _try_consume(self, tokens):
+        # Returns 0 when a request slot and `tokens` were taken, otherwise seconds until they could be
+        db.session.rollback()  # Read the budget as other workers last committed it
+        budget = db.session.get(RateBudget, self.name)
+        now = _utcnow()
+        if budget is None:
+            try:
+                db.session.add(RateBudget(
+                    name=self.name,
+                    requests_available=float(self.rpm or 0),
+                    tokens_available=float(self.tpm or 0),
+                    updated_at=now,
+                    version=0
+                ))
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+            return self.poll_interval / 10  # Draw from the new bucket on the next pass
+
+        elapsed = max(0.0, (now - budget.updated_at).total_seconds())
+        requests_available = self._refill(budget.requests_available, self.rpm, elapsed)
+        tokens_available = self._refill(budget.tokens_available, self.tpm, elapsed)
+        if self.tpm is not None:
+            tokens = min(tokens, self.tpm)  # A prompt larger than the whole budget waits for a full bucket
+
+        if requests_available < 1:
+            return (1 - requests_available) * 60.0 / self.rpm
+        if tokens_available < tokens:
+            return (tokens - tokens_available) * 60.0 / self.tpm
+
+        updated = RateBudget.query.filter_by(name=self.name, version=budget.version).update({
+            'requests_available': requests_available - 1 if self.rpm is not None else 0.0,
+            'tokens_available': tokens_available - tokens if self.tpm is not None else 0.0,
+            'updated_at': now,
+            'version': budget.version + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        return 0 if updated == 1 else self.poll_interval / 10  # Lost a race; look again shortly
+
+    def _head_ticket_ids(self):
+        cutoff = _utcnow() - datetime.timedelta(seconds=self.ticket_ttl)
+        rows = db.session.query(DecisionTicket.id).filter(
+            DecisionTicket.scheduler == self.name,
+            DecisionTicket.heartbeat_at >= cutoff
+        ).order_by(DecisionTicket.priority.desc(), DecisionTicket.id).limit(self.head_size).all()
+        return {ticket_id for ticket_id, in rows}
+
+    def acquire(self, tokens, priority=0, timeout=None, deadline=None):
+        # Blocks until this caller may send a request of `tokens` tokens; returns seconds waited.
+        # Gives up after `timeout` seconds or at `deadline` (a time.monotonic() value, e.g. when
+        # the decision it is for has been answered by the fallback), whichever comes first.
+        started = time.monotonic()
+        if timeout is not None:
+            deadline = started + timeout if deadline is None else min(deadline, started + timeout)
+        if deadline is not None and started >= deadline:
+            raise SchedulerTimeout("No time left to wait for the OpenAI rate budget")
+        now = _utcnow()
+        ticket = DecisionTicket(scheduler=self.name, priority=priority, enqueued_at=now, heartbeat_at=now)
+        db.session.add(ticket)
+        db.session.commit()
+        ticket_id = ticket.id
+        last_heartbeat = started
+
+        try:
+            while True:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise SchedulerTimeout(f"Waited {time.monotonic() - started:.1f}s for the OpenAI rate budget")
+
+                if time.monotonic() - last_heartbeat > self.ticket_ttl / 3:
+                    DecisionTicket.query.filter_by(id=ticket_id).update({'heartbeat_at': _utcnow()}, synchronize_session=False)
+                    db.session.commit()
+                    last_heartbeat = time.monotonic()
+
+                if ticket_id in self._head_ticket_ids():
+                    wait = self._try_consume(tokens)
+                    if wait == 0:
+                        break
+                    time.sleep(self._pause(min(wait, self.poll_interval), deadline))
+                else:
+                    db.session.rollback()
+                    time.sleep(self._pause(self.poll_interval, deadline))
+        finally:
+            self._release(ticket_id)
+
+        waited = time.monotonic() - started
+        with self._waits_lock:
+            self._waits.append(waited)
+        return waited
+
+    def _pause(self, seconds, deadline):
+        if deadline is None:
+            return seconds
+        return max(0.0, min(seconds, deadline - time.monotonic()))
+
+    def try_acquire(self, tokens):
+        # Take budget without queueing, e.g. for a hedged request; only when nobody is waiting
+        cutoff = _utcnow() - datetime.timedelta(seconds=self.ticket_ttl)
+        waiting = db.session.query(DecisionTicket.id).filter(
+            DecisionTicket.scheduler == self.name,
+            DecisionTicket.heartbeat_at >= cutoff
+        ).first()
+        if waiting is not None:
+            db.session.rollback()
+            return False
+        return self._try_consume(tokens) == 0
+
+    def _release(self, ticket_id):
+        try:
+            db.session.rollback()
+            stale = _utcnow() - datetime.timedelta(seconds=self.ticket_ttl * 2)
+            DecisionTicket.query.filter(
+                db.or_(DecisionTicket.id == ticket_id, DecisionTicket.heartbeat_at < stale)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            log_error('db_error', f"Unexpected error: {e}", operation='_release')
+
+    def stats(self):
+        # Queue depth and oldest wait are shared across workers; wait percentiles are this worker's
+        cutoff = _utcnow() - datetime.timedelta(seconds=self.ticket_ttl)
+        depth, oldest = db.session.query(
+            db.func.count(DecisionTicket.id), db.func.min(DecisionTicket.enqueued_at)
+        ).filter(
+            DecisionTicket.scheduler == self.name,
+            DecisionTicket.heartbeat_at >= cutoff
+        ).one()
+
+        with self._waits_lock:
+            waits = sorted(self._waits)
+
+        def percentile(fraction):
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(len(waits) * fraction))], 3)
+
+        return {
+            'queue_depth': depth,
+            'oldest_wait_seconds': round((_utcnow() - oldest).total_seconds(), 3) if oldest else 0.0,
+            'wait_p50_seconds': percentile(0.5),
+            'wait_p95_seconds': percentile(0.95),
+            'requests_per_minute': self.rpm,
+            'tokens_per_minute': self.tpm
+        }
+
+
+def rate_scheduler_from_env():
+    # Returns None unless an OpenAI RPM or TPM budget is configured
+    rpm = os.getenv('OPENAI_RPM_LIMIT')
+    tpm = os.getenv('OPENAI_TPM_LIMIT')
+    if not rpm and not tpm:
+        return None
+    return RateScheduler(
+        rpm=float(rpm) if rpm else None,
+        tpm=float(tpm) if tpm else None,
+        poll_interval=float(os.getenv('SCHEDULER_POLL_INTERVAL', 0.1)),
+        head_size=int(os.getenv('SCHEDULER_HEAD_SIZE', 8))
+    )
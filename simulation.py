@@ -0,0 +1,82 @@
+import numpy as np
+from game_engine import initial_tokens, tokens_per_usd, base_payment_usd, payoffs, bonus_usd, earnings_usd
+
+
+# Bulk simulation of the game with NumPy, for the `flask simulate` command; kept out of
+# game_engine so that serving the study never imports NumPy.
+#
+# Vectorized policies. A policy is called as policy(rng, own, other, game)
+# where own and other are (participants, game) arrays of the contributions made so far, and
+# returns one contribution per participant.
+def fixed_policy(contribution):
+    def policy(rng, own, other, game):
+        return np.full(own.shape[0], contribution, dtype=np.int64)
+    return policy
+
+
+def random_policy(low=0, high=initial_tokens):
+    def policy(rng, own, other, game):
+        return rng.integers(low, high + 1, size=own.shape[0])
+    return policy
+
+
+def tit_for_tat_policy(opening=initial_tokens):
+    # Opens with `opening`, then repeats the other player's previous contribution
+    def policy(rng, own, other, game):
+        if game == 0:
+            return np.full(own.shape[0], opening, dtype=np.int64)
+        return other[:, game - 1].copy()
+    return policy
+
+
+def empirical_policy(counts):
+    # Draws from a {contribution: count} distribution, e.g. the LLM bot's recorded moves
+    values = np.array(sorted(counts), dtype=np.int64)
+    weights = np.array([counts[value] for value in values], dtype=float)
+    weights /= weights.sum()
+
+    def policy(rng, own, other, game):
+        return rng.choice(values, size=own.shape[0], p=weights)
+    return policy
+
+
+def make_policy(spec):
+    # 'fixed:5', 'random', 'random:3:8', 'tit_for_tat' or 'tit_for_tat:0'
+    name, _, arguments = spec.partition(':')
+    arguments = [int(argument) for argument in arguments.split(':')] if arguments else []
+    if name == 'fixed':
+        return fixed_policy(*arguments)
+    if name == 'random':
+        return random_policy(*arguments)
+    if name == 'tit_for_tat':
+        return tit_for_tat_policy(*arguments)
+    raise ValueError(f"Unknown policy: {spec}")
+
+
+def simulate(human_policy, bot_policy, participants=100000, games=20, seed=None,
+             tokens_per_usd=tokens_per_usd, base_payment_usd=base_payment_usd, **rules):
+    # Plays `games` rounds for every simulated participant at once and prices the result with
+    # the given payment constants. Returns a dict of (participants, games) arrays for the
+    # contributions and scores, and per-participant bonus and earnings in USD.
+    rng = np.random.default_rng(seed)
+    max_contribution = rules.get('initial_tokens', initial_tokens)
+    contribution = np.zeros((participants, games), dtype=np.int64)
+    bot_contribution = np.zeros((participants, games), dtype=np.int64)
+
+    for game in range(games):
+        # Both players move simultaneously, seeing only earlier games
+        human_move = human_policy(rng, contribution, bot_contribution, game)
+        bot_move = bot_policy(rng, bot_contribution, contribution, game)
+        contribution[:, game] = np.clip(human_move, 0, max_contribution)
+        bot_contribution[:, game] = np.clip(bot_move, 0, max_contribution)
+
+    score, bot_score, _ = payoffs(contribution, bot_contribution, **rules)
+    bonus = bonus_usd(score.mean(axis=1), tokens_per_usd)
+    return {
+        'contribution': contribution,
+        'bot_contribution': bot_contribution,
+        'score': score,
+        'bot_score': bot_score,
+        'bonus_usd': bonus,
+        'earnings_usd': earnings_usd(bonus, base_payment_usd)
+    }
@@ -0,0 +1,44 @@
+// Likert buttons: record each answer and enable Continue once all six are answered
+document.addEventListener("DOMContentLoaded", function() {
+    const questionAnswers = {};
+    const buttons = document.querySelectorAll(".likert-button");
+
+    // Set up button click handlers for each likert button
+    buttons.forEach(button => {
+        button.addEventListener("click", function() {
+            const question = this.dataset.question;
+            const value = this.dataset.value;
+
+            // Store the selected value in questionAnswers
+            questionAnswers[question] = value;
+
+            // Update hidden input field to store value
+            document.getElementById(`incom_${question}`).value = value;
+
+            // Visual feedback: highlight selected button
+            const siblingButtons = document.querySelectorAll(`.likert-button[data-question="${question}"]`);
+            siblingButtons.forEach(sibling => sibling.classList.remove("active"));
+            this.classList.add("active");
+
+            // Check if all questions have been answered
+            const allQuestionsAnswered = Object.keys(questionAnswers).length === 6;
+            const submitButton = document.getElementById("submit-button");
+
+            // Enable submit button only when all questions are answered
+            if (allQuestionsAnswered) {
+                submitButton.classList.remove("disabled");
+                submitButton.disabled = false;
+                submitButton.style.backgroundColor = '#007BFF';
+            }
+        });
+    });
+
+    // Before form submit, ensure the latest values are stored in hidden inputs
+    const form = document.getElementById("incom-form");
+    form.addEventListener("submit", function(event) {
+        Object.keys(questionAnswers).forEach(question => {
+            // Ensure hidden input fields are updated with the latest selected value
+            document.getElementById(`incom_${question}`).value = questionAnswers[question];
+        });
+    });
+});
@@ -0,0 +1,11 @@
+// Countdown and redirect after 15 seconds
+let timeLeft = 15;
+const countdown = setInterval(function() {
+    if (timeLeft <= 0) {
+        clearInterval(countdown);
+        window.location.href = "https://app.prolific.com/submissions/complete?cc=CVGCDEN7";  // Prolific redirect URL
+    } else {
+        document.getElementById("countdown").innerHTML = timeLeft + " seconds";
+    }
+    timeLeft -= 1;
+}, 1000);
@@ -0,0 +1,200 @@
+import os
+import time
+import random
+import logging
+import asyncio
+import threading
+import contextvars
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from event_log import log_event, log_error
+
+
+# A strategy turns a decision context into the bot's contribution. The context is a dict with
+# 'game_history' (finished rounds of the current session), 'session_num', 'group' and
+# 'messages' (the LLM prompt); strategies read only what they need. ResilientStrategy adds
+# 'deadline', the time.monotonic() value after which the primary's answer would be thrown away.
+def decision_fields(context):
+    # The round a decision context belongs to, for log events
+    return {field: context[field] for field in ('participant_id', 'session_num', 'round_num') if field in context}
+
+
+class BotStrategy(ABC):
+    name = 'strategy'
+
+    @abstractmethod
+    def decide(self, context):
+        # The bot's contribution for this decision context
+        pass
+
+
+class LLMStrategy(BotStrategy):
+    name = 'llm'
+
+    def __init__(self, request_fn, async_request_fn=None):
+        self.request_fn = request_fn
+        self.async_request_fn = async_request_fn
+
+    def decide(self, context):
+        return self.request_fn(context)
+
+    async def decide_async(self, context):
+        if self.async_request_fn is None:
+            return await asyncio.to_thread(self.request_fn, context)
+        return await self.async_request_fn(context)
+
+
+class TitForTatStrategy(BotStrategy):
+    # Opens cooperatively, then repeats the human's previous contribution
+    name = 'tit_for_tat'
+
+    def __init__(self, opening=10):
+        self.opening = opening
+
+    def decide(self, context):
+        game_history = context.get('game_history') or []
+        if not game_history:
+            return self.opening
+        last_game = max(game_history, key=lambda g: g['game_num'])
+        return last_game['human_contribution']
+
+
+class FixedStrategy(BotStrategy):
+    name = 'fixed'
+
+    def __init__(self, contribution):
+        self.contribution = contribution
+
+    def decide(self, context):
+        return self.contribution
+
+
+class EmpiricalStrategy(BotStrategy):
+    # Samples from the distribution of contributions the LLM bot actually made. counts_loader
+    # returns {contribution: count}; it is re-read at most every refresh_interval seconds.
+    name = 'empirical'
+
+    def __init__(self, counts_loader, refresh_interval=300, max_contribution=10):
+        self.counts_loader = counts_loader
+        self.refresh_interval = refresh_interval
+        self.max_contribution = max_contribution
+        self._counts = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _distribution(self):
+        with self._lock:
+            if self._counts is None or time.monotonic() - self._loaded_at > self.refresh_interval:
+                try:
+                    self._counts = dict(self.counts_loader())
+                except Exception as e:
+                    log_error('strategy_error', f"Could not load empirical bot contributions: {e}")
+                    self._counts = self._counts or {}
+                self._loaded_at = time.monotonic()
+            return self._counts
+
+    def decide(self, context):
+        counts = {value: count for value, count in self._distribution().items() if count > 0}
+        if not counts:
+            return random.randint(0, self.max_contribution)
+        values = list(counts)
+        return random.choices(values, weights=[counts[value] for value in values])[0]
+
+
+class CircuitBreaker:
+    # Opens after `failure_threshold` consecutive failures and lets one trial call
+    # through once `cooldown` seconds have passed
+    def __init__(self, failure_threshold=3, cooldown=30):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                # Half-open: allow a trial and re-open immediately if it fails
+                self._opened_at = None
+                self._failures = self.failure_threshold - 1
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+
+class ResilientStrategy:
+    # Runs the primary strategy under a latency budget and answers with the fallback
+    # strategy when the primary is slow, failing, or its circuit breaker is open
+    def __init__(self, primary, fallback, breaker=None, max_workers=8):
+        self.primary = primary
+        self.fallback = fallback
+        self.breaker = breaker or CircuitBreaker()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='strategy')
+
+    def decide(self, context, budget):
+        # Returns (contribution, source) where source names the strategy that answered
+        if budget > 0 and self.breaker.allow():
+            context = dict(context, deadline=time.monotonic() + budget)
+            # In the caller's context (as asyncio.to_thread does), so the primary sees its app
+            future = self.executor.submit(contextvars.copy_context().run, self.primary.decide, context)
+            try:
+                contribution = future.result(timeout=budget)
+                self.breaker.record_success()
+                return contribution, self.primary.name
+            except Exception as e:
+                self.breaker.record_failure()
+                reason = 'timed out' if not future.done() else f'failed: {e}'
+                log_event('strategy_fallback', f"Primary bot strategy {reason}", logging.WARNING,
+                          primary=self.primary.name, fallback=self.fallback.name, **decision_fields(context))
+
+        return self.fallback.decide(context), self.fallback.name
+
+    async def decide_async(self, context, budget):
+        # decide() for the event loop; a primary that overruns the budget is cancelled
+        if budget > 0 and self.breaker.allow():
+            context = dict(context, deadline=time.monotonic() + budget)
+            if hasattr(self.primary, 'decide_async'):
+                attempt = self.primary.decide_async(context)
+            else:
+                attempt = asyncio.to_thread(self.primary.decide, context)
+            try:
+                contribution = await asyncio.wait_for(attempt, budget)
+                self.breaker.record_success()
+                return contribution, self.primary.name
+            except Exception as e:
+                self.breaker.record_failure()
+                reason = 'timed out' if isinstance(e, asyncio.TimeoutError) else f'failed: {e}'
+                log_event('strategy_fallback', f"Primary bot strategy {reason}", logging.WARNING,
+                          primary=self.primary.name, fallback=self.fallback.name, **decision_fields(context))
+
+        # Off the loop: a fallback may query the database (EmpiricalStrategy's counts), and
+        # during an outage every decision on the loop comes through here
+        return await asyncio.to_thread(self.fallback.decide, context), self.fallback.name
+
+
+def make_strategy(name, counts_loader=None):
+    # Build a local strategy from its configured name
+    if name == 'tit_for_tat':
+        return TitForTatStrategy(opening=int(os.getenv('BOT_TIT_FOR_TAT_OPENING', 10)))
+    if name == 'fixed':
+        return FixedStrategy(int(os.getenv('BOT_FIXED_CONTRIBUTION', 5)))
+    if name == 'empirical':
+        return EmpiricalStrategy(counts_loader or dict, refresh_interval=int(os.getenv('BOT_EMPIRICAL_REFRESH', 300)))
+    raise ValueError(f"Unknown bot strategy: {name}")
@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'bench'))
+
+from fake_openai import start_fake_openai
+from llm_client import DecisionClient
+from models import db
+
+messages = [{'role': 'user', 'content': 'How many tokens do you contribute?'}]
+
+
+@pytest.fixture
+def fake_openai():
+    server = start_fake_openai(latency=0.02, jitter=0.0, reply='7')
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def make_client(fake_openai):
+    clients = []
+
+    def make(**options):
+        options.setdefault('hedge_percentile', None)
+        client = DecisionClient(api_key='sk-test', base_url=fake_openai.base_url, pool_size=4, **options)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+@pytest.fixture
+def flask_app(tmp_path):
+    flask_app = Flask(__name__)
+    flask_app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(flask_app)
+    with flask_app.app_context():
+        db.create_all()
+    return flask_app
+
+
+@pytest.fixture
+def app_context(flask_app):
+    with flask_app.app_context():
+        yield
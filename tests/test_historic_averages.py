@@ -0,0 +1,45 @@
+# Recomputing the study baselines, which every worker process does once they go stale
+#
+#   python -m pytest tests
+import datetime
+import threading
+
+from models import db, Participant, HistoricAverage
+from historic_averages import recompute_study_averages
+
+
+def add_finished_round(participant_id, group, session_num, round_num, contribution, bot_contribution):
+    now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+    db.session.add(Participant(
+        prolific_pid=participant_id, session_id='s', participant_id=participant_id, group=group,
+        session_num=session_num, round_num=round_num, contribution=contribution, bot_contribution=bot_contribution,
+        participant_balance=0, bot_balance=0, net_gain=0, start_timestamp=now, end_timestamp=now
+    ))
+
+
+def test_concurrent_recomputes_write_each_row_once(flask_app):
+    with flask_app.app_context():
+        for round_num in range(1, 11):
+            add_finished_round('p1', 'treatment', 1, round_num, 4, 6)
+            add_finished_round('p2', 'control', 1, round_num, 8, 2)
+        db.session.commit()
+
+    written = []
+
+    def recompute():
+        with flask_app.app_context():
+            written.append(recompute_study_averages())
+
+    # Workers that find the rows stale together, right after a deploy
+    for _ in range(3):
+        threads = [threading.Thread(target=recompute) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert written == [6] * 12  # No recompute failed and rolled back
+    with flask_app.app_context():
+        assert HistoricAverage.query.count() == 6
+        row = HistoricAverage.query.filter_by(source='study', group='all', session_num=0).one()
+        assert (row.human_avg_contribution, row.ai_avg_contribution, row.rounds) == (6.0, 4.0, 20)
@@ -0,0 +1,64 @@
+# Hedging and retries of the decision client, against the local stand-in for the OpenAI
+# API in bench/fake_openai.py
+#
+#   python -m pytest tests
+import time
+import threading
+
+import openai
+import pytest
+
+from conftest import messages
+
+
+def test_answers_without_hedging_when_fast(fake_openai, make_client):
+    client = make_client(hedge_after=0.5)
+    completion = client.create(messages, max_tokens=2)
+    assert completion.choices[0].message.content == '7'
+    assert fake_openai.requests_served == 1
+
+
+def test_hedge_answers_when_first_attempt_is_slow(fake_openai, make_client):
+    # The first request hits the slow tail; the hedge sent after hedge_after does not
+    fake_openai.options.tail_rate, fake_openai.options.tail_latency = 1.0, 1.0
+
+    def end_tail_after_first_request():
+        while not fake_openai.requests_served:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        fake_openai.options.tail_rate = 0.0
+    threading.Thread(target=end_tail_after_first_request, daemon=True).start()
+    client = make_client(hedge_after=0.3)
+
+    started = time.monotonic()
+    completion = client.create(messages, max_tokens=2)
+    assert completion.choices[0].message.content == '7'
+    assert time.monotonic() - started < 0.9
+    assert fake_openai.requests_served == 2
+
+    while fake_openai.requests_in_flight:  # Let the slow attempt finish before the client closes
+        time.sleep(0.05)
+
+
+def test_retries_server_errors_with_backoff_then_gives_up(fake_openai, make_client):
+    fake_openai.options.error_rate = 1.0
+    client = make_client(max_retries=2, backoff=0.1)
+    admitted = []
+
+    started = time.monotonic()
+    with pytest.raises(openai.InternalServerError):
+        client.create(messages, admit=lambda blocking: admitted.append(blocking) or True, max_tokens=2)
+    assert fake_openai.requests_served == 3
+    assert admitted == [True, True]  # Every retry asks the rate budget first
+    assert time.monotonic() - started >= 0.1 * 0.5 + 0.2 * 0.5  # Smallest jittered backoff
+
+
+def test_deadline_cuts_retries_short(fake_openai, make_client):
+    fake_openai.options.error_rate = 1.0
+    client = make_client(max_retries=5, backoff=1.0)
+
+    # The pause before a retry would end past the deadline, so the error is raised instead
+    with pytest.raises((openai.InternalServerError, openai.APITimeoutError)):
+        client.create(messages, deadline=time.monotonic() + 0.5, max_tokens=2)
+    assert fake_openai.requests_served == 1
+
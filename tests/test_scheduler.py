@@ -0,0 +1,169 @@
+# The shared OpenAI rate budget: admission, the ticket queue and the token bucket, and the
+# decision client sending through it to bench/fake_openai.py with its --rpm limit on
+#
+#   python -m pytest tests
+import time
+import datetime
+import threading
+
+import openai
+import pytest
+
+from conftest import messages
+from fake_openai import start_fake_openai
+from llm_client import DecisionClient
+from models import db, RateBudget, DecisionTicket
+from scheduler import RateScheduler, SchedulerTimeout, _utcnow
+
+
+def test_admits_within_budget_then_times_out(app_context):
+    scheduler = RateScheduler(name='test', rpm=2, poll_interval=0.02)
+    assert scheduler.acquire(10, timeout=1) < 1
+    assert scheduler.acquire(10, timeout=1) < 1
+    assert not scheduler.try_acquire(10)
+
+    started = time.monotonic()
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire(10, timeout=5, deadline=time.monotonic() + 0.2)
+    assert time.monotonic() - started < 1  # The decision's deadline wins over the longer timeout
+    assert DecisionTicket.query.count() == 0  # The ticket is released on the way out
+
+
+def send_at_once(count, decide):
+    outcomes = []
+    threads = [threading.Thread(target=lambda: outcomes.append(decide())) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(outcomes)
+
+
+@pytest.fixture
+def limited_openai():
+    # Answers 429 beyond 3 requests a minute, like an exhausted OpenAI account
+    server = start_fake_openai(latency=0.02, jitter=0.0, reply='7', rpm=3)
+    client = DecisionClient(api_key='sk-test', base_url=server.base_url, max_retries=0, hedge_percentile=None)
+    yield server, client
+    client.close()
+    server.shutdown()
+
+
+def test_callers_without_the_scheduler_hit_the_limit(limited_openai):
+    server, client = limited_openai
+
+    def decide():
+        try:
+            client.create(messages, max_tokens=2)
+            return 'answered'
+        except openai.RateLimitError:
+            return 'rate limited'
+
+    assert send_at_once(6, decide) == ['answered'] * 3 + ['rate limited'] * 3
+
+
+def test_callers_through_the_scheduler_stay_within_the_limit(limited_openai, flask_app):
+    server, client = limited_openai
+    scheduler = RateScheduler(name='test', rpm=3, poll_interval=0.02)
+
+    def decide():
+        with flask_app.app_context():
+            try:
+                scheduler.acquire(20, timeout=1)
+            except SchedulerTimeout:
+                return 'timed out'
+        try:
+            client.create(messages, max_tokens=2)
+            return 'answered'
+        except openai.RateLimitError:
+            return 'rate limited'
+
+    # The three callers beyond the budget wait in the queue and give up instead of sending
+    assert send_at_once(6, decide) == ['answered'] * 3 + ['timed out'] * 3
+    assert server.requests_limited == 0
+    assert server.requests_served == 3
+
+
+def test_waiting_ticket_sends_heartbeats(flask_app):
+    scheduler = RateScheduler(name='test', rpm=1, poll_interval=0.02, ticket_ttl=0.3)
+    with flask_app.app_context():
+        scheduler.acquire(10, timeout=1)  # Spend the budget, so the next caller has to wait
+
+    def wait_for_budget():
+        with flask_app.app_context():
+            with pytest.raises(SchedulerTimeout):
+                scheduler.acquire(10, timeout=0.8)
+    waiter = threading.Thread(target=wait_for_budget)
+    waiter.start()
+
+    heartbeats = []
+    for _ in range(2):
+        time.sleep(0.3)
+        with flask_app.app_context():
+            heartbeats.append(db.session.query(DecisionTicket.heartbeat_at).scalar())
+    waiter.join()
+
+    assert None not in heartbeats
+    assert heartbeats[1] > heartbeats[0]
+    with flask_app.app_context():
+        assert DecisionTicket.query.count() == 0
+
+
+def test_stale_tickets_are_skipped_and_cleaned_up(app_context):
+    # A ticket left behind by a worker that died; it would otherwise hold the head of the queue
+    scheduler = RateScheduler(name='test', rpm=5, poll_interval=0.02, head_size=1, ticket_ttl=0.5)
+    long_ago = _utcnow() - datetime.timedelta(seconds=10)
+    db.session.add(DecisionTicket(scheduler='test', priority=100, enqueued_at=long_ago, heartbeat_at=long_ago))
+    db.session.commit()
+
+    assert scheduler.acquire(10, timeout=1) < 1  # The dead ticket is not ahead of this one
+    assert DecisionTicket.query.count() == 0  # Released along with this caller's ticket
+    assert scheduler.try_acquire(10)  # Nobody is waiting any more
+
+
+class RacingScheduler(RateScheduler):
+    # Another worker takes from the bucket between this one's read and its versioned update
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.races = 1
+
+    def _refill(self, available, limit, elapsed):
+        if self.races:
+            self.races -= 1
+            with db.engine.begin() as connection:
+                connection.execute(
+                    RateBudget.__table__.update().where(RateBudget.name == self.name)
+                    .values(requests_available=RateBudget.requests_available - 1, version=RateBudget.version + 1)
+                )
+        return super()._refill(available, limit, elapsed)
+
+
+def test_lost_version_race_is_retried(app_context):
+    scheduler = RacingScheduler(name='test', rpm=5, poll_interval=0.02)
+    scheduler.races = 0
+    assert scheduler._try_consume(10) > 0  # Creates the bucket
+    scheduler.races = 1
+
+    assert scheduler._try_consume(10) == scheduler.poll_interval / 10  # Lost the race
+    assert scheduler._try_consume(10) == 0
+    db.session.rollback()
+    budget = db.session.get(RateBudget, 'test')
+    assert budget.version == 2
+    assert round(budget.requests_available) == 3  # One for each worker, none lost or counted twice
+
+
+def test_hedge_skipped_when_rate_budget_is_spent(fake_openai, make_client, app_context):
+    scheduler = RateScheduler(name='test', rpm=1, poll_interval=0.02)
+    scheduler.acquire(10, timeout=1)  # The first request's share of the budget
+    fake_openai.options.latency = 0.4
+    client = make_client(hedge_after=0.1)
+
+    def admit(blocking):
+        if blocking:
+            scheduler.acquire(10, timeout=1)
+            return True
+        return scheduler.try_acquire(10)
+
+    completion = client.create(messages, admit=admit, max_tokens=2)
+    assert completion.choices[0].message.content == '7'
+    assert fake_openai.requests_served == 1